@@ -1,9 +1,9 @@
 # insta_clean_pretty.py
 # Full app: login-first modal + prettier UI + per-account tokens & cache + dashboard + unfollow
 # Now with local PyTorch gender model (no API limits)
+# Non-UI logic lives in insta_core.py; the logged-in account is core.ACCOUNT
 import tkinter as tk
 from tkinter import ttk, messagebox
-import requests
 import json
 import threading
 import time
@@ -12,353 +12,39 @@ import webbrowser
 import traceback
 import os
 import sys
-# For charting
-import matplotlib
-matplotlib.use("TkAgg")
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-# For local model
-import torch
-import re
-
-# ---- Local Model Files (must be in same folder) ----
-MODEL_PATH = "gender_model.pth"
-VOCAB_PATH = "vocab.json"
-MAX_NAME_LEN = 20
-DEVICE = "cpu"
-
-# Load vocab
-if os.path.exists(VOCAB_PATH):
-    with open(VOCAB_PATH, 'r', encoding='utf-8') as f:
-        char_to_idx = json.load(f)
-else:
-    print("Error: vocab.json not found. Train the model first.")
-    char_to_idx = {}
-
-vocab_size = len(char_to_idx)
-
-# Model class (same as training)
-class GenderCNN(torch.nn.Module):
-    def __init__(self, vocab_size, embed_dim=32, num_filters=64):
-        super().__init__()
-        self.embedding = torch.nn.Embedding(vocab_size, embed_dim, padding_idx=0)
-        self.conv1 = torch.nn.Conv1d(embed_dim, num_filters, kernel_size=3, padding=1)
-        self.conv2 = torch.nn.Conv1d(num_filters, num_filters, kernel_size=3, padding=1)
-        self.pool = torch.nn.AdaptiveMaxPool1d(1)
-        self.fc = torch.nn.Linear(num_filters, 1)
-        self.sigmoid = torch.nn.Sigmoid()
-
-    def forward(self, x):
-        x = self.embedding(x)
-        x = x.transpose(1, 2)
-        x = torch.relu(self.conv1(x))
-        x = torch.relu(self.conv2(x))
-        x = self.pool(x).squeeze(-1)
-        x = self.fc(x).squeeze(-1)
-        return self.sigmoid(x)
-
-# Load model
-if os.path.exists(MODEL_PATH):
-    model = GenderCNN(vocab_size).to(DEVICE)
-    model.load_state_dict(torch.load(MODEL_PATH, map_location=DEVICE))
-    model.eval()
-else:
-    print("Error: gender_model.pth not found. Train the model first.")
-    model = None
-
-def predict_gender(name: str) -> dict:
-    if not model or not name or len(name) < 2:
-        return {"name": name, "gender": None, "probability": 0, "count": 0}
-    # Clean name (keep Arabic/Unicode letters)
-    name = re.sub(r'[^a-zA-Z\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF ]', '', name.lower())[:MAX_NAME_LEN]
-    seq = [char_to_idx.get(c, 0) for c in name]
-    seq += [0] * (MAX_NAME_LEN - len(seq))
-    x = torch.tensor([seq], dtype=torch.long).to(DEVICE)
-    with torch.no_grad():
-        prob = model(x).item()
-    gender = "female" if prob > 0.5 else "male"
-    conf = prob if gender == "female" else (1 - prob)
-    return {"name": name, "gender": gender, "probability": round(conf, 3), "count": 0}
-
-# ---- DEFAULT TOKENS (prefilled; can be changed in Login modal) ----
-DEFAULT_CSRFTOKEN = ""
-DEFAULT_SESSIONID = ""
-DEFAULT_DS_USER_ID = ""
-
-# ---- Filenames base (per-account) ----
-TOKEN_FILE_BASE = "instacreds" # instacreds_<ds_user_id>.json
-GENDER_CACHE_BASE = "gender_cache" # gender_cache_<ds_user_id>.json
-
-# ---- Requests session & headers (will be updated by apply_tokens) ----
-SESSION = requests.Session()
-SESSION.headers.update({
-"User-Agent": "Instagram 155.0.0.37.107",
-"x-requested-with": "XMLHttpRequest",
-"referer": "https://www.instagram.com/",
-"accept": "*/*",
-"accept-language": "en-US,en;q=0.9",
-"content-type": "application/x-www-form-urlencoded; charset=UTF-8",
-})
-
-# Globals
-CSRFTOKEN = DEFAULT_CSRFTOKEN
-SESSIONID = DEFAULT_SESSIONID
-DS_USER_ID = DEFAULT_DS_USER_ID
-BASE_HEADERS = {
-"x-csrftoken": CSRFTOKEN,
-"User-Agent": SESSION.headers.get("User-Agent"),
-"Referer": "https://www.instagram.com/"
-}
-
-# ---- Helpers: filenames per account ----
-def token_filename_for(ds_user_id):
-    return f"{TOKEN_FILE_BASE}_{ds_user_id}.json" if ds_user_id else f"{TOKEN_FILE_BASE}.json"
-
-def cache_filename_for(ds_user_id):
-    return f"{GENDER_CACHE_BASE}_{ds_user_id}.json" if ds_user_id else f"{GENDER_CACHE_BASE}.json"
-
-# ---- Persist & apply tokens (per-account) ----
-def apply_tokens(csrftoken, sessionid, ds_user_id):
-    global CSRFTOKEN, SESSIONID, DS_USER_ID, BASE_HEADERS, GENDER_CACHE_FILE
-    CSRFTOKEN = csrftoken or ""
-    SESSIONID = sessionid or ""
-    DS_USER_ID = ds_user_id or ""
-    # set/clear cookies in requests session
-    try:
-        if SESSIONID:
-            SESSION.cookies.set("sessionid", SESSIONID, domain=".instagram.com")
-        else:
-            SESSION.cookies.clear(domain=".instagram.com", name="sessionid")
-    except Exception:
-        pass
-    try:
-        if CSRFTOKEN:
-            SESSION.cookies.set("csrftoken", CSRFTOKEN, domain=".instagram.com")
-        else:
-            SESSION.cookies.clear(domain=".instagram.com", name="csrftoken")
-    except Exception:
-        pass
-    try:
-        if DS_USER_ID:
-            SESSION.cookies.set("ds_user_id", DS_USER_ID, domain=".instagram.com")
-        else:
-            SESSION.cookies.clear(domain=".instagram.com", name="ds_user_id")
-    except Exception:
-        pass
-    BASE_HEADERS = {
-"x-csrftoken": CSRFTOKEN,
-"User-Agent": SESSION.headers.get("User-Agent"),
-"Referer": "https://www.instagram.com/"
-    }
-    # save tokens to per-account file
-    tf = token_filename_for(DS_USER_ID)
-    try:
-        with open(tf, "w", encoding="utf-8") as f:
-            json.dump({"csrftoken": CSRFTOKEN, "sessionid": SESSIONID, "ds_user_id": DS_USER_ID}, f)
-    except Exception as e:
-        print("Failed to save tokens:", e)
-    # set cache file name and load it
-    load_gender_cache_into_global()
-
-def load_tokens_if_exist():
-    global CSRFTOKEN, SESSIONID, DS_USER_ID
-    candidates = []
-    if DEFAULT_DS_USER_ID:
-        candidates.append(token_filename_for(DEFAULT_DS_USER_ID))
-    candidates.append(token_filename_for(""))
-    for tf in candidates:
-        if os.path.exists(tf):
-            try:
-                with open(tf, "r", encoding="utf-8") as f:
-                    d = json.load(f)
-                apply_tokens(d.get("csrftoken", CSRFTOKEN), d.get("sessionid", SESSIONID), d.get("ds_user_id", DS_USER_ID))
-                return
-            except Exception:
-                continue
-    # if nothing found, apply defaults but don't save
-    apply_tokens(CSRFTOKEN, SESSIONID, DS_USER_ID)
-
-# ---- Genderize cache (per-account) ----
-GENDER_CACHE = {}
-GENDER_CACHE_FILE = cache_filename_for(DS_USER_ID)
-def load_gender_cache_into_global():
-    global GENDER_CACHE, GENDER_CACHE_FILE
-    GENDER_CACHE_FILE = cache_filename_for(DS_USER_ID)
-    if os.path.exists(GENDER_CACHE_FILE):
-        try:
-            with open(GENDER_CACHE_FILE, "r", encoding="utf-8") as f:
-                GENDER_CACHE = json.load(f)
-                GENDER_CACHE = {k.lower(): v for k, v in GENDER_CACHE.items()}
-            return
-        except Exception:
-            GENDER_CACHE = {}
-    else:
-        GENDER_CACHE = {}
-
-def save_gender_cache_global():
-    global GENDER_CACHE, GENDER_CACHE_FILE
-    try:
-        with open(GENDER_CACHE_FILE, "w", encoding="utf-8") as f:
-            json.dump(GENDER_CACHE, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print("Failed to save gender cache:", e)
+import queue
+from concurrent.futures import ThreadPoolExecutor
+import insta_core as core
+from insta_core import (
+    FOLLOWERS_HASH, UserTable, UserSearchIndex, apply_tokens, token_filename_for, cache_filename_for,
+    cache_files_for, load_model, scan_account,
+    unfollow_user, iter_users_incremental, genderize_with_cache, names_for_users, new_gender_stats, tally_genders,
+)
 
 # load tokens & cache at startup (doesn't show UI)
-load_tokens_if_exist()
-load_gender_cache_into_global()
+core.load_tokens_if_exist()
 
-# ---- Instagram helpers ----
-def fetch_users(query_hash, user_id, edge_type):
-    url = "https://www.instagram.com/graphql/query/"
-    results = []
-    has_next = True
-    end_cursor = None
-    while has_next:
-        variables = {
-            "id": user_id,
-            "include_reel": True,
-            "fetch_mutual": False,
-            "first": 50
-        }
-        if end_cursor:
-            variables["after"] = end_cursor
-        full_url = f"{url}?query_hash={query_hash}&variables={json.dumps(variables)}"
-        try:
-            res = SESSION.get(full_url, headers=BASE_HEADERS, timeout=15)
-        except Exception as e:
-            print("Network error fetching users:", e)
-            break
-        if res.status_code != 200:
-            print(f"Non-200 while fetching users: {res.status_code} - {res.text[:200]}")
-            break
-        try:
-            data = res.json()["data"]["user"][edge_type]
-        except Exception as e:
-            print("Failed to parse JSON while fetching users:", e)
-            break
-        edges = data.get("edges", [])
-        for edge in edges:
-            node = edge.get("node", {})
-            results.append({
-                "id": node.get("id"),
-                "username": node.get("username"),
-                "full_name": node.get("full_name")
-            })
-        page_info = data.get("page_info", {})
-        has_next = page_info.get("has_next_page", False)
-        end_cursor = page_info.get("end_cursor")
-        time.sleep(1)
-    return results
+# ---- Plotting (matplotlib is only imported once a chart is needed) ----
+def import_plotting():
+    import matplotlib
+    matplotlib.use("TkAgg")
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    return Figure, FigureCanvasTkAgg
 
-def get_nonfollowers():
-    following_hash = "3dec7e2c57367ef3da3d987d89f9dbc8"
-    followers_hash = "c76146de99bb02f6415203be841dd25a"
-    following = fetch_users(following_hash, DS_USER_ID, "edge_follow")
-    followers = fetch_users(followers_hash, DS_USER_ID, "edge_followed_by")
-    follower_usernames = {u["username"] for u in followers if u.get("username")}
-    nonfollowers = [u for u in following if u.get("username") not in follower_usernames]
-    return nonfollowers
-
-def fetch_followers_list():
-    followers_hash = "c76146de99bb02f6415203be841dd25a"
-    followers = fetch_users(followers_hash, DS_USER_ID, "edge_followed_by")
-    return followers
-
-def unfollow_user(user_id):
-    url = f"https://www.instagram.com/web/friendships/{user_id}/unfollow/"
+def warm_up():
+    # background thread: pay the torch / model / matplotlib import cost before the dashboard needs it
     try:
-        res = SESSION.post(url, headers={"x-csrftoken": CSRFTOKEN, "Referer": "https://www.instagram.com/"}, timeout=15)
+        load_model()
+        import_plotting()
     except Exception as e:
-        return False, None, f"Network exception: {e}"
-    code = res.status_code
-    text = res.text
-    success = False
-    try:
-        j = res.json()
-        success = (j.get("status") == "ok")
-    except Exception:
-        success = (code == 200)
-    return success, code, text
-
-# ---- Prepare name for model ----
-def prepare_name_for_genderize(user):
-    """
-    Extract a sensible first-name token from the user's full_name or username.
-    Normalizes common separators (underscore, dot, dash) into spaces so names
-    like "Ghazi_sdi", "john.doe" or "mary-jane" yield "Ghazi", "john" and "mary".
-    """
-    def normalize_and_first_token(s):
-        if not s:
-            return ""
-        # replace common non-letter separators with space
-        for sep in ("_", ".", "-", "/"):
-            s = s.replace(sep, " ")
-        s = s.strip()
-        if not s:
-            return ""
-        # take the first whitespace-separated token
-        first = s.split()[0]
-        # keep only alphabetic characters (protects against numbers/symbols)
-        cleaned = ''.join([c for c in first if c.isalpha() or '\u0600' <= c <= '\u06FF'])  # Keep Arabic
-        return cleaned or first
-
-    full_name = (user.get("full_name") or "").strip()
-    if full_name:
-        token = normalize_and_first_token(full_name)
-        return token[:50]
-
-    username = (user.get("username") or "").strip()
-    if username:
-        token = normalize_and_first_token(username)
-        return token[:50] if token else username[:50]
-    return ""
-
-# ---- Local Gender Prediction with Cache ----
-def genderize_with_cache(names, progress_callback=None, cancel_event=None):
-    global GENDER_CACHE
-    results = []
-    total = len(names)
-    done = 0
-    to_lookup = []
-    lookup_indices = []
-    for idx, n in enumerate(names):
-        nkey = (n or "").lower()
-        if nkey in GENDER_CACHE:
-            results.append(GENDER_CACHE[nkey])
-            done += 1
-            if progress_callback:
-                progress_callback(done, total)
-        else:
-            results.append(None)
-            to_lookup.append(n)
-            lookup_indices.append(idx)
-
-    for i in range(len(to_lookup)):
-        if cancel_event and cancel_event.is_set():
-            break
-        name = to_lookup[i]
-        if not name:
-            entry = {"name": name, "gender": None, "probability": 0, "count": 0}
-        else:
-            entry = predict_gender(name)
-        key = name.lower()
-        GENDER_CACHE[key] = entry
-        original_idx = lookup_indices[i]
-        results[original_idx] = entry
-        done += 1
-        if progress_callback:
-            progress_callback(done, total)
-    save_gender_cache_global()
-
-    # Fill any None
-    for idx, item in enumerate(results):
-        if item is None:
-            n = names[idx]
-            results[idx] = {"name": n, "gender": None, "probability": 0, "count": 0}
-
-    return results
+        print("Warm-up failed:", e)
 
 # ---- PRETTY UI: styles & utilities ----
+MODEL_WARMUP_DELAY_MS = 500 # load torch + model in the background this long after the window shows (None = on first use)
+UNFOLLOW_PAGE_SIZE = 0 # users per page in the Unfollow tab (0 = one scrollable list)
+SEARCH_DEBOUNCE_MS = 150 # wait this long after the last keystroke before searching
+
 def setup_styles(root):
     style = ttk.Style(root)
     # try a modern-ish theme where available
@@ -397,6 +83,107 @@ def setup_styles(root):
 "subtext": subtext
     }
 
+# ---- Virtualized user list (recycled row widgets) ----
+class VirtualUserList(tk.Frame):
+    """
+    Scrollable list that keeps only enough row widgets to fill the visible
+    area and rebinds them to data on scroll, so the widget count stays fixed
+    however many users are shown.
+    """
+    ROW_HEIGHT = 58
+
+    def __init__(self, master, colors, is_selected, on_toggle, on_open):
+        super().__init__(master, bg=colors["panel"])
+        self.colors = colors
+        self.is_selected = is_selected
+        self.on_toggle = on_toggle
+        self.on_open = on_open
+        self.items = []
+        self.top = 0
+        self.pool = []
+        self.body = tk.Frame(self, bg=colors["panel"])
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.yview)
+        self.body.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+        self.empty_lbl = tk.Label(self.body, text="No users found.", bg=colors["panel"], fg=colors["subtext"])
+        self.body.bind("<Configure>", lambda e: self._resize_pool())
+        self._bind_wheel(self.body)
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self.scroll_rows(-1 if e.delta > 0 else 1))
+        widget.bind("<Button-4>", lambda e: self.scroll_rows(-1))
+        widget.bind("<Button-5>", lambda e: self.scroll_rows(1))
+
+    def _make_row(self):
+        c = self.colors
+        row = tk.Frame(self.body, bg=c["card"], bd=0, relief="flat")
+        left = tk.Frame(row, bg=c["card"])
+        left.pack(side="left", fill="both", expand=True, padx=8, pady=6)
+        row.name_lbl = tk.Label(left, text="", bg=c["card"], fg=c["text"], font=("Segoe UI", 11, "bold"), anchor="w")
+        row.name_lbl.pack(anchor="w")
+        row.sub_lbl = tk.Label(left, text="", bg=c["card"], fg=c["subtext"], font=("Segoe UI", 9), anchor="w")
+        row.sub_lbl.pack(anchor="w")
+        row.var = tk.BooleanVar(value=False)
+        chk = tk.Checkbutton(row, variable=row.var, bg=c["card"], activebackground=c["card"], selectcolor=c["card"])
+        chk.pack(side="right", padx=8)
+        row.user = None
+        chk.config(command=lambda r=row: r.user is not None and self.on_toggle(r.user.get("id"), r.var.get()))
+        row.name_lbl.bind("<Button-1>", lambda e, r=row: r.user is not None and self.on_open(r.user.get("username")))
+        for w in (row, left, row.name_lbl, row.sub_lbl, chk):
+            self._bind_wheel(w)
+        return row
+
+    def _resize_pool(self):
+        height = max(self.body.winfo_height(), self.ROW_HEIGHT)
+        needed = height // self.ROW_HEIGHT + 1
+        while len(self.pool) < needed:
+            self.pool.append(self._make_row())
+        self.render()
+
+    def visible_rows(self):
+        return max(1, self.body.winfo_height() // self.ROW_HEIGHT)
+
+    def set_items(self, items, keep_position=False):
+        self.items = items
+        if not keep_position:
+            self.top = 0
+        self.render()
+
+    def scroll_rows(self, n):
+        self.top += n
+        self.render()
+
+    def yview(self, *args):
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.items))
+        elif args[0] == "scroll":
+            step = self.visible_rows() if args[2] == "pages" else 1
+            self.top += int(args[1]) * step
+        self.render()
+
+    def render(self):
+        total = len(self.items)
+        self.top = max(0, min(self.top, total - self.visible_rows()))
+        width = self.body.winfo_width()
+        for i, row in enumerate(self.pool):
+            idx = self.top + i
+            if idx >= total:
+                row.user = None
+                row.place_forget()
+                continue
+            user = self.items[idx]
+            row.user = user
+            row.name_lbl.config(text=user.get("username", "(unknown)"))
+            row.sub_lbl.config(text=user.get("full_name") or "")
+            row.var.set(self.is_selected(user.get("id")))
+            row.place(x=8, y=i * self.ROW_HEIGHT + 3, width=max(width - 16, 1), height=self.ROW_HEIGHT - 6)
+        if total:
+            self.empty_lbl.place_forget()
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self.visible_rows()) / total))
+        else:
+            self.empty_lbl.place(relx=0.5, y=14, anchor="n")
+            self.scrollbar.set(0.0, 1.0)
+
 # ---- APP CLASS ----
 class InstaApp:
     def __init__(self, root):
@@ -440,6 +227,8 @@ class InstaApp:
         # If tokens present (non-empty) we still require the user to confirm them by Save & Apply.
         # So show the login modal on startup and force Save & Apply to enable pages.
         self.root.after(120, self.show_initial_login_prompt)
+        if MODEL_WARMUP_DELAY_MS is not None:
+            self.root.after(MODEL_WARMUP_DELAY_MS, lambda: threading.Thread(target=warm_up, daemon=True).start())
     # ----- UI builders -----
     def _build_unfollow_tab(self):
         card_pad = 10
@@ -449,7 +238,7 @@ class InstaApp:
         controls = tk.Frame(self.unfollow_frame, bg=self.colors["panel"])
         controls.pack(fill="x", padx=12, pady=(0,8))
         self.search_var = tk.StringVar()
-        self.search_var.trace_add('write', self.filter_list)
+        self.search_var.trace_add('write', self.on_search_changed)
         search_entry = tk.Entry(controls, textvariable=self.search_var, font=("Segoe UI", 11), width=30, bg="#23282B", fg=self.colors["text"], insertbackground=self.colors["text"], relief="flat")
         search_entry.pack(side="left", padx=(0,8))
         self.load_btn = ttk.Button(controls, text="🔍 Scan Now", style="Primary.TButton", command=self.start_scan)
@@ -457,23 +246,23 @@ class InstaApp:
         self.unfollow_btn = ttk.Button(controls, text="🚫 Unfollow Selected", style="Accent.TButton", command=self.unfollow_selected)
         self.unfollow_btn.pack(side="left", padx=6)
         self.unfollow_btn.state(["disabled"])
-        # list area (with canvas + scrollbar)
-        list_holder = tk.Frame(self.unfollow_frame, bg=self.colors["panel"])
-        list_holder.pack(expand=True, fill="both", padx=12, pady=(6,12))
-        self.canvas = tk.Canvas(list_holder, bg=self.colors["panel"], highlightthickness=0)
-        self.scrollbar = ttk.Scrollbar(list_holder, orient="vertical", command=self.canvas.yview)
-        self.scrollable_frame = tk.Frame(self.canvas, bg=self.colors["panel"])
-        self.scrollable_frame.bind(
-"<Configure>",
-lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+        self.scan_delta_label = tk.Label(controls, text="", bg=self.colors["panel"], fg=self.colors["subtext"])
+        self.scan_delta_label.pack(side="left", padx=12)
+        # scan / unfollow progress (fed by a ProgressReporter)
+        self.task_progress_label = tk.Label(controls, text="", bg=self.colors["panel"], fg=self.colors["subtext"])
+        self.task_progress_label.pack(side="left", padx=6)
+        # list area (virtualized: a fixed pool of row widgets is rebound on scroll)
+        self.user_list = VirtualUserList(
+            self.unfollow_frame, self.colors,
+            is_selected=lambda uid: uid in self.selected_ids,
+            on_toggle=self.toggle_selected,
+            on_open=self.open_profile,
         )
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
-        self.canvas.pack(side="left", fill="both", expand=True)
-        self.scrollbar.pack(side="right", fill="y")
-        # page nav
+        self.user_list.pack(expand=True, fill="both", padx=12, pady=(6,12))
+        # page nav (only shown when the list is paged)
         nav = tk.Frame(self.unfollow_frame, bg=self.colors["panel"])
-        nav.pack(fill="x", padx=12, pady=(0,12))
+        if UNFOLLOW_PAGE_SIZE:
+            nav.pack(fill="x", padx=12, pady=(0,12))
         self.prev_btn = ttk.Button(nav, text="← Prev", style="Alt.TButton", command=self.prev_page)
         self.prev_btn.pack(side="left")
         self.page_label = tk.Label(nav, text="Page 1", bg=self.colors["panel"], fg=self.colors["subtext"])
@@ -481,12 +270,15 @@ lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
         self.next_btn = ttk.Button(nav, text="Next →", style="Alt.TButton", command=self.next_page)
         self.next_btn.pack(side="left")
         # low-level data
-        self.users = []
+        self.users = UserTable()
         self.filtered_users = []
-        self.check_vars = []
         self.selected_ids = set()
         self.page = 0
-        self.per_page = 10
+        self.per_page = UNFOLLOW_PAGE_SIZE
+        self.search_index = UserSearchIndex([])
+        self.search_pool = ThreadPoolExecutor(max_workers=1)
+        self.search_after_id = None
+        self.search_generation = 0
     def _build_dashboard_tab(self):
         title = tk.Label(self.dashboard_frame, text="Dashboard · Followers Stats", bg=self.colors["panel"], fg=self.colors["primary"] if "primary" in self.colors else self.colors["accent"], font=("Segoe UI", 16, "bold"))
         title.pack(anchor="w", padx=12, pady=(12,4))
@@ -505,17 +297,24 @@ lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
         self.progress_bar.pack(padx=12, pady=(8,0))
         self.progress_label.pack(padx=12, pady=(2,8))
         # chart & summary
-        chart_wrap = tk.Frame(self.dashboard_frame, bg=self.colors["panel"])
+        self.chart_wrap = chart_wrap = tk.Frame(self.dashboard_frame, bg=self.colors["panel"])
         chart_wrap.pack(expand=True, fill="both", padx=12, pady=8)
-        self.figure = Figure(figsize=(6,4), dpi=100)
-        self.ax = self.figure.add_subplot(111)
-        self.ax.text(0.5,0.5,"No data yet", horizontalalignment='center', verticalalignment='center', transform=self.ax.transAxes, color="#777")
-        self.ax.axis('off')
-        self.canvas_fig = FigureCanvasTkAgg(self.figure, master=chart_wrap)
-        self.canvas_fig.get_tk_widget().pack(side="left", expand=True, fill="both", padx=(0,8))
+        # placeholder until the first results: the matplotlib canvas is created by _ensure_chart
+        self.figure = None
+        self.canvas_fig = None
+        self.chart_placeholder = tk.Label(chart_wrap, text="No data yet", bg="white", fg="#777")
+        self.chart_placeholder.pack(side="left", expand=True, fill="both", padx=(0,8))
         self.summary_text = tk.Text(chart_wrap, width=36, height=14, bg="#121212", fg="#ddd", bd=0, padx=8, pady=8)
         self.summary_text.pack(side="right", fill="y")
         self.dashboard_cancel_event = None
+    def _ensure_chart(self):
+        if self.figure is not None:
+            return
+        Figure, FigureCanvasTkAgg = import_plotting()
+        self.figure = Figure(figsize=(6,4), dpi=100)
+        self.canvas_fig = FigureCanvasTkAgg(self.figure, master=self.chart_wrap)
+        self.chart_placeholder.destroy()
+        self.canvas_fig.get_tk_widget().pack(side="left", expand=True, fill="both", padx=(0,8), before=self.summary_text)
     # ----- Notebook enable/disable -----
     def _set_notebook_enabled(self, enabled: bool):
         # disable tab switching by disabling all tabs or the widget itself
@@ -549,7 +348,7 @@ lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
         self.open_login_modal(require_save=True)
     # ----- Token UI helpers -----
     def open_token_file(self):
-        path = os.path.abspath(token_filename_for(DS_USER_ID))
+        path = os.path.abspath(token_filename_for(core.ACCOUNT.ds_user_id))
         if os.path.exists(path):
             try:
                 if sys.platform.startswith('win'):
@@ -580,15 +379,15 @@ lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
         tk.Label(frm, text="CSRFTOKEN", bg=self.colors["panel"], fg=self.colors["subtext"]).grid(row=0, column=0, sticky="w")
         csrf_entry = tk.Text(frm, height=2, bg="#222", fg=self.colors["text"], bd=0)
         csrf_entry.grid(row=0, column=1, sticky="we", padx=8, pady=6)
-        csrf_entry.insert("1.0", CSRFTOKEN)
+        csrf_entry.insert("1.0", core.ACCOUNT.csrftoken)
         tk.Label(frm, text="SESSIONID", bg=self.colors["panel"], fg=self.colors["subtext"]).grid(row=1, column=0, sticky="w")
         sess_entry = tk.Text(frm, height=2, bg="#222", fg=self.colors["text"], bd=0)
         sess_entry.grid(row=1, column=1, sticky="we", padx=8, pady=6)
-        sess_entry.insert("1.0", SESSIONID)
+        sess_entry.insert("1.0", core.ACCOUNT.sessionid)
         tk.Label(frm, text="DS_USER_ID (numeric)", bg=self.colors["panel"], fg=self.colors["subtext"]).grid(row=2, column=0, sticky="w")
         ds_entry = tk.Entry(frm, bg="#222", fg=self.colors["text"], bd=0)
         ds_entry.grid(row=2, column=1, sticky="we", padx=8, pady=6)
-        ds_entry.insert(0, DS_USER_ID)
+        ds_entry.insert(0, core.ACCOUNT.ds_user_id)
         frm.columnconfigure(1, weight=1)
         btn_frame = tk.Frame(modal, bg=self.colors["panel"])
         btn_frame.pack(fill="x", padx=12, pady=8)
@@ -651,27 +450,30 @@ lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
         txt.config(state="disabled")
         ttk.Button(win, text="OK", command=win.destroy).pack(pady=8)
     def clear_tokens_and_cache(self):
-        tf = token_filename_for(DS_USER_ID)
-        cf = cache_filename_for(DS_USER_ID)
-        confirm = messagebox.askyesno("Confirm clear", f"This will delete:\n\n{os.path.abspath(tf)}\n{os.path.abspath(cf)}\n\nProceed?")
+        tf = token_filename_for(core.ACCOUNT.ds_user_id)
+        cf = cache_filename_for(core.ACCOUNT.ds_user_id)
+        sf = core.snapshot_root_for(core.ACCOUNT.ds_user_id)
+        confirm = messagebox.askyesno("Confirm clear", f"This will delete:\n\n{os.path.abspath(tf)}\n{os.path.abspath(cf)}\n{os.path.abspath(sf)}\n\nProceed?")
         if not confirm:
             return
         errors = []
-        for p in [tf, cf]:
+        # the open cache connection must be released before its files can be removed
+        core.ACCOUNT.close_cache()
+        for p in [tf] + cache_files_for(core.ACCOUNT.ds_user_id):
             try:
                 if os.path.exists(p):
                     os.remove(p)
             except Exception as e:
                 errors.append(str(e))
+        core.clear_snapshots(core.ACCOUNT.ds_user_id)
         # clear in-memory cookies and cache
         try:
-            SESSION.cookies.clear(domain=".instagram.com", name="sessionid")
-            SESSION.cookies.clear(domain=".instagram.com", name="csrftoken")
-            SESSION.cookies.clear(domain=".instagram.com", name="ds_user_id")
+            core.ACCOUNT.session.cookies.clear(domain=".instagram.com", name="sessionid")
+            core.ACCOUNT.session.cookies.clear(domain=".instagram.com", name="csrftoken")
+            core.ACCOUNT.session.cookies.clear(domain=".instagram.com", name="ds_user_id")
         except Exception:
             pass
         apply_tokens("", "", "")
-        load_gender_cache_into_global()
         if errors:
             messagebox.showwarning("Partial success", f"Cleared files, but some errors occurred:\n{errors}")
         else:
@@ -684,67 +486,61 @@ lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
         self.unfollow_btn.state(["disabled"])
         threading.Thread(target=self.load_nonfollowers, daemon=True).start()
     def load_nonfollowers(self):
+        delta = None
+        incomplete = []
+        reporter = core.ProgressReporter(lambda p: self.root.after(0, self._update_task_progress, "Scanning", p, "users"))
         try:
-            nonfollowers = get_nonfollowers()
+            scan = scan_account(progress_callback=reporter.update)
+            nonfollowers = scan["nonfollowers"]
+            delta = scan["followers_delta"]
+            incomplete = [edge for edge in ("following", "followers") if scan[f"{edge}_status"] not in ("complete", "stopped")]
+            search_index = UserSearchIndex(nonfollowers)
         except Exception as e:
             print("Exception while loading nonfollowers:", e)
             traceback.print_exc()
-            nonfollowers = []
-        self.root.after(0, self.on_nonfollowers_loaded, nonfollowers)
-    def on_nonfollowers_loaded(self, nonfollowers):
+            nonfollowers = UserTable()
+            search_index = UserSearchIndex(nonfollowers)
+        self.root.after(0, self.on_nonfollowers_loaded, nonfollowers, delta, search_index, incomplete)
+    def _update_task_progress(self, action, progress, unit):
+        self.task_progress_label.config(text=f"{action} {core.format_progress(progress, unit)}")
+    def on_nonfollowers_loaded(self, nonfollowers, delta=None, search_index=None, incomplete=()):
+        self.task_progress_label.config(text="")
+        if incomplete:
+            self.scan_delta_label.config(text=f"Incomplete scan: fetching your {' and '.join(incomplete)} failed")
+        elif delta is None:
+            self.scan_delta_label.config(text="")
+        else:
+            self.scan_delta_label.config(text=f"Since last scan: +{len(delta['added'])} new / -{len(delta['removed'])} lost followers")
         self.users = nonfollowers
-        self.filtered_users = nonfollowers
+        self.search_index = search_index or UserSearchIndex(nonfollowers)
+        self.filtered_users = list(nonfollowers)
         self.page = 0
         self.selected_ids.clear()
         self.display_users()
+        if self.search_var.get():
+            self.filter_list()
         self.load_btn.state(["!disabled"])
         if self.filtered_users:
             self.unfollow_btn.state(["!disabled"])
         else:
             self.unfollow_btn.state(["disabled"])
+        if incomplete:
+            messagebox.showwarning("Incomplete scan", f"Fetching your {' and '.join(incomplete)} list failed partway, so this list may include people who do follow you back.\n\nScan again before unfollowing.")
     def display_users(self):
-        # clear frame
-        for w in self.scrollable_frame.winfo_children():
-            w.destroy()
-        self.check_vars.clear()
+        if not self.per_page:
+            self.user_list.set_items(self.filtered_users)
+            return
         start = self.page * self.per_page
         end = start + self.per_page
-        users_to_display = self.filtered_users[start:end]
-        if not users_to_display:
-            lbl = tk.Label(self.scrollable_frame, text="No users found.", bg=self.colors["panel"], fg=self.colors["subtext"])
-            lbl.pack(pady=14)
-        else:
-            for user in users_to_display:
-                uid = user.get("id")
-                username = user.get("username", "(unknown)")
-                fullname = user.get("full_name") or ""
-                card = tk.Frame(self.scrollable_frame, bg=self.colors["card"], bd=0, relief="flat")
-                card.pack(fill="x", padx=8, pady=6)
-                left = tk.Frame(card, bg=self.colors["card"])
-                left.pack(side="left", fill="both", expand=True, padx=8, pady=8)
-                name_lbl = tk.Label(left, text=username, bg=self.colors["card"], fg=self.colors["text"], font=("Segoe UI", 11, "bold"))
-                name_lbl.pack(anchor="w")
-                if fullname:
-                    sub = tk.Label(left, text=fullname, bg=self.colors["card"], fg=self.colors["subtext"], font=("Segoe UI", 9))
-                    sub.pack(anchor="w")
-                right = tk.Frame(card, bg=self.colors["card"])
-                right.pack(side="right", padx=8, pady=8)
-                var = tk.BooleanVar(value=(uid in self.selected_ids))
-                chk = tk.Checkbutton(right, variable=var, bg=self.colors["card"], activebackground=self.colors["card"], selectcolor=self.colors["card"])
-                chk.pack(side="right")
-                # when toggled update selected_ids
-                def on_toggle(u=uid, v=var):
-                    if v.get():
-                        self.selected_ids.add(u)
-                    else:
-                        self.selected_ids.discard(u)
-                chk.config(command=on_toggle)
-                # open profile on click
-                name_lbl.bind("<Button-1>", lambda e, u=username: self.open_profile(u))
-                self.check_vars.append((var, user))
+        self.user_list.set_items(self.filtered_users[start:end])
         self.page_label.config(text=f"Page {self.page + 1}")
         self.prev_btn.state(["!disabled"] if self.page > 0 else ["disabled"])
         self.next_btn.state(["!disabled"] if end < len(self.filtered_users) else ["disabled"])
+    def toggle_selected(self, uid, selected):
+        if selected:
+            self.selected_ids.add(uid)
+        else:
+            self.selected_ids.discard(uid)
     def next_page(self):
         self.page += 1
         self.display_users()
@@ -762,11 +558,12 @@ lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
         self.load_btn.state(["disabled"])
         threading.Thread(target=self.unfollow_thread, daemon=True).start()
     def unfollow_thread(self):
-        id_to_user = {u["id"]: u for u in self.users if u.get("id")}
-        to_unfollow_ids = [uid for uid in list(self.selected_ids) if uid in id_to_user]
+        to_unfollow_ids = [uid for uid in list(self.selected_ids) if uid in self.users]
         results = []
+        reporter = core.ProgressReporter(lambda p: self.root.after(0, self._update_task_progress, "Unfollowing", p, "users"))
+        reporter.update(0, len(to_unfollow_ids))
         for uid in to_unfollow_ids:
-            user = id_to_user.get(uid)
+            user = self.users.get(uid)
             username = user.get("username", "(unknown)")
             try:
                 success, code, text = unfollow_user(uid)
@@ -775,31 +572,45 @@ lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
             print(f"Attempt unfollow {username} ({uid}) -> success={success}, code={code}")
             results.append((username, success, code, text))
             if success:
-                try:
-                    self.users = [x for x in self.users if x.get("id") != uid]
-                    self.filtered_users = [x for x in self.filtered_users if x.get("id") != uid]
-                except Exception:
-                    pass
+                # O(1) removal; filtered_users is rebuilt once when the batch completes
+                self.users.remove(uid)
                 self.selected_ids.discard(uid)
+            reporter.advance()
             time.sleep(random.uniform(4.0, 6.0))
         self.root.after(0, self.on_unfollow_complete, results)
     def on_unfollow_complete(self, results):
+        self.task_progress_label.config(text="")
         successes = [r for r in results if r[1]]
         failures = [r for r in results if not r[1]]
-        self.page = 0
-        self.display_users()
-        self.unfollow_btn.state(["!disabled"] if self.filtered_users else ["disabled"])
         self.load_btn.state(["!disabled"])
+        self.filter_list()  # re-enables Unfollow once the refreshed list arrives
         message = f"Finished. Unfollowed {len(successes)} user(s). {len(failures)} failed."
         messagebox.showinfo("Done", message)
+    def on_search_changed(self, *args):
+        # debounce: only the last keystroke within SEARCH_DEBOUNCE_MS runs a query
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(SEARCH_DEBOUNCE_MS, self.filter_list)
     def filter_list(self, *args):
-        search_term = self.search_var.get().lower()
-        if search_term:
-            self.filtered_users = [u for u in self.users if search_term in (u.get('username') or "").lower()]
-        else:
-            self.filtered_users = list(self.users)
+        # queries run on a worker thread; results from superseded queries are dropped
+        self.search_after_id = None
+        self.search_generation += 1
+        generation = self.search_generation
+        query = self.search_var.get()
+        index = self.search_index
+        users = self.users
+        def run():
+            matches = [u for u in index.search(query) if u.id in users]
+            self.root.after(0, self._apply_search, generation, matches)
+        self.search_pool.submit(run)
+    def _apply_search(self, generation, matches):
+        if generation != self.search_generation:
+            return
+        self.filtered_users = matches
         self.page = 0
         self.display_users()
+        if not self.load_btn.instate(["disabled"]):  # a scan or unfollow batch owns the buttons
+            self.unfollow_btn.state(["!disabled"] if self.filtered_users else ["disabled"])
     def open_profile(self, username):
         url = f"https://www.instagram.com/{username}/"
         webbrowser.open(url)
@@ -819,71 +630,62 @@ lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
             self.dashboard_status.config(text="Cancel requested — stopping soon...")
             self.cancel_btn.state(["disabled"])
     def dashboard_thread(self, cancel_event):
-        try:
-            followers = fetch_followers_list()
-        except Exception as e:
-            followers = []
-            print("Error fetching followers for dashboard:", e)
-            traceback.print_exc()
-        self.root.after(0, self.process_followers_for_dashboard, followers, cancel_event)
-    def process_followers_for_dashboard(self, followers, cancel_event):
-        count_total = len(followers)
-        if count_total == 0:
-            self.dashboard_status.config(text="No followers or failed to fetch")
-            self.fetch_followers_btn.state(["!disabled"])
-            self.cancel_btn.state(["disabled"])
-            messagebox.showinfo("No data", "No followers were fetched. Check your tokens or network.")
-            return
-        self.dashboard_status.config(text=f"Preparing names ({count_total})...")
-        names = []
-        user_map = []
-        for u in followers:
-            name = prepare_name_for_genderize(u)
-            if not name:
-                name = u.get("username") or ""
-            names.append(name)
-            user_map.append(u)
-        self.progress_bar['maximum'] = len(names)
-        self.progress_bar['value'] = 0
-        self.progress_label.config(text=f"0 / {len(names)}")
-        def progress_cb(done, total):
-            self.root.after(0, self._update_progress_ui, done, total)
-        def run_genderize():
-            results = genderize_with_cache(names, progress_callback=progress_cb, cancel_event=cancel_event)
-            canceled = cancel_event.is_set()
-            male = female = unknown = 0
-            gender_details = []
-            for idx, r in enumerate(results):
-                gender = r.get("gender")
-                prob = r.get("probability") or 0
-                name_sent = r.get("name")
-                username = user_map[idx].get("username")
-                if gender == "male":
-                    male += 1
-                elif gender == "female":
-                    female += 1
-                else:
-                    unknown += 1
-                gender_details.append((username, name_sent, gender, prob))
-            stats = {
-"total": len(results),
-"male": male,
-"female": female,
-"unknown": unknown,
-"details": gender_details,
-"canceled": canceled
-            }
+        # pages are fetched on one thread and analyzed here as they arrive
+        if not core.model_loaded():
+            self.root.after(0, lambda: self.dashboard_status.config(text="Loading gender model..."))
+        pages = queue.Queue()
+        fetch_state = {}
+        def fetch_pages():
+            try:
+                for page in iter_users_incremental(FOLLOWERS_HASH, core.ACCOUNT.ds_user_id, "edge_followed_by", state=fetch_state):
+                    pages.put(page)
+                    if cancel_event.is_set():
+                        break
+            except Exception as e:
+                print("Error fetching followers for dashboard:", e)
+                traceback.print_exc()
+            finally:
+                pages.put(None)
+        threading.Thread(target=fetch_pages, daemon=True).start()
+        load_model()  # while the first page is in flight
+        stats = new_gender_stats()
+        # per-name progress is coalesced here and reaches Tk at most every PROGRESS_INTERVAL
+        reporter = core.ProgressReporter(lambda p: self.root.after(0, self._update_progress_ui, p))
+        while True:
+            page = pages.get()
+            if page is None:
+                break
+            if cancel_event.is_set():
+                continue
+            def progress_cb(done, total, offset=stats["total"]):
+                reporter.update(offset + done, max(fetch_state.get("total") or 0, offset + total))
+            results = genderize_with_cache(names_for_users(page), progress_callback=progress_cb, cancel_event=cancel_event)
+            tally_genders(stats, page, results)
+            partial = {k: v for k, v in stats.items() if k != "details"}
+            self.root.after(0, self.show_dashboard_results, partial, False)
+        reporter.finish()
+        stats["canceled"] = cancel_event.is_set()
+        if stats["total"] == 0 and not stats["canceled"]:
+            self.root.after(0, self.on_dashboard_no_data)
+        else:
             self.root.after(0, self.show_dashboard_results, stats)
-        threading.Thread(target=run_genderize, daemon=True).start()
-    def _update_progress_ui(self, done, total):
+    def on_dashboard_no_data(self):
+        self.dashboard_status.config(text="No followers or failed to fetch")
+        self.fetch_followers_btn.state(["!disabled"])
+        self.cancel_btn.state(["disabled"])
+        messagebox.showinfo("No data", "No followers were fetched. Check your tokens or network.")
+    def _update_progress_ui(self, progress):
+        done, total = progress["done"], progress["total"]
         try:
+            self.progress_bar['maximum'] = max(total, 1)
             self.progress_bar['value'] = done
-            self.progress_label.config(text=f"{done} / {total}")
+            self.progress_label.config(text=core.format_progress(progress, "names"))
             pct = (done/total*100) if total else 0
             self.dashboard_status.config(text=f"Analyzing names — {pct:.0f}%")
         except Exception:
             pass
-    def show_dashboard_results(self, stats):
+    def show_dashboard_results(self, stats, final=True):
+        """Render stats; called after every page (final=False) and once at the end."""
         total = stats["total"]
         male = stats["male"]
         female = stats["female"]
@@ -892,9 +694,10 @@ lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
         status_text = f"Done — analyzed {total} followers"
         if canceled:
             status_text = f"Stopped early — analyzed {total} followers (partial)"
-        self.dashboard_status.config(text=status_text)
-        self.fetch_followers_btn.state(["!disabled"])
-        self.cancel_btn.state(["disabled"])
+        if final:
+            self.dashboard_status.config(text=status_text)
+            self.fetch_followers_btn.state(["!disabled"])
+            self.cancel_btn.state(["disabled"])
         self.summary_text.delete("1.0", tk.END)
         self.summary_text.insert(tk.END, f"Total followers processed: {total}\n")
         if total:
@@ -904,8 +707,16 @@ lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
         if canceled:
             self.summary_text.insert(tk.END, "\nAnalysis was canceled by the user. Partial results shown.\n")
         self.summary_text.insert(tk.END, "\nNote: Local PyTorch model — no API limits, offline predictions.\n")
-        self.progress_label.config(text=f"{total} / {total}")
-        self.progress_bar['value'] = total
+        if core.PREDICTION_CACHE is not None:
+            cs = core.PREDICTION_CACHE.stats()
+            self.summary_text.insert(tk.END, f"Shared name cache: {cs['hits'] + cs['disk_hits']} hits, {cs['misses']} misses\n")
+        if core.INFERENCE is not None:
+            inf = core.INFERENCE.stats()
+            self.summary_text.insert(tk.END, f"Model: {inf['scored']} names in {inf['batches']} batches ({core.INFERENCE_BACKEND})\n")
+        if final:
+            self.progress_label.config(text=f"{total} / {total}")
+            self.progress_bar['maximum'] = max(total, 1)
+            self.progress_bar['value'] = total
         # draw pie chart
         labels = []
         sizes = []
@@ -915,11 +726,12 @@ lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
             labels.append("Female"); sizes.append(female)
         if unknown > 0:
             labels.append("Unknown"); sizes.append(unknown)
+        self._ensure_chart()
         self.figure.clf()
         ax = self.figure.add_subplot(111)
         if sizes:
             ax.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=140)
-            ax.set_title(f"Followers by predicted gender — {DS_USER_ID or 'unknown'}")
+            ax.set_title(f"Followers by predicted gender — {core.ACCOUNT.ds_user_id or 'unknown'}")
         else:
             ax.text(0.5,0.5,"No data to display", horizontalalignment='center', verticalalignment='center', transform=ax.transAxes, color="#777")
         ax.axis('off')
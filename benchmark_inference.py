@@ -0,0 +1,51 @@
+# benchmark_inference.py
+# Per-batch latency of each available GenderCNN inference runtime (run after training/export)
+import argparse
+import os
+import pandas as pd
+from name_encoder import load_vocab, build_lookup, encode_names
+from gender_model import load_eager, eager_runtime, torchscript_runtime, onnx_runtime, compiled_runtime, bf16_supported, benchmark
+
+MODEL_PATH = "gender_model.pth"
+VOCAB_PATH = "vocab.json"
+SCRIPTED_MODEL_PATH = "gender_model.ts"
+ONNX_MODEL_PATH = "gender_model.onnx"
+INT8_MODEL_PATH = "gender_model_int8.ts"
+DATA_PATH = "dataname_clean.csv"
+
+def available_runtimes(model, compiled=False):
+    runtimes = {"eager": eager_runtime(model)}
+    if compiled:
+        bf16 = bf16_supported()
+        runtimes["compiled+bf16" if bf16 else "compiled"] = compiled_runtime(model, bf16)
+    if os.path.exists(SCRIPTED_MODEL_PATH):
+        runtimes["torchscript"] = torchscript_runtime(SCRIPTED_MODEL_PATH)
+    if os.path.exists(INT8_MODEL_PATH):
+        runtimes["int8"] = torchscript_runtime(INT8_MODEL_PATH)
+    if os.path.exists(ONNX_MODEL_PATH):
+        try:
+            runtimes["onnx"] = onnx_runtime(ONNX_MODEL_PATH)
+        except ImportError:
+            print("onnxruntime not installed: skipping ONNX")
+    return runtimes
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark GenderCNN inference runtimes")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64, 512, 4096])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--compiled", action="store_true", help="also time torch.compile (+ bf16 autocast) inference; compiling takes a while")
+    args = parser.parse_args()
+
+    char_to_idx = load_vocab(VOCAB_PATH)
+    names = pd.read_csv(DATA_PATH)["name"].dropna().astype(str).tolist()
+    X = encode_names(names[:max(args.batch_sizes)], build_lookup(char_to_idx))
+    runtimes = available_runtimes(load_eager(MODEL_PATH, len(char_to_idx)), args.compiled)
+
+    print(f"{'batch':>7} " + " ".join(f"{name:>14}" for name in runtimes) + "   (ms per batch, speedup vs eager)")
+    for bs in args.batch_sizes:
+        times = {name: benchmark(run, X, bs, args.repeats) for name, run in runtimes.items()}
+        cells = [f"{times[name]*1000:8.3f} x{times['eager']/times[name]:4.1f}" for name in runtimes]
+        print(f"{bs:>7} " + " ".join(f"{c:>14}" for c in cells))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# gender_model.py
+# GenderCNN model + export and optimized CPU inference (shared by training, testing and the app)
+import os
+import time
+import numpy as np
+import torch
+import torch.nn as nn
+from name_encoder import MAX_NAME_LEN
+
+# ------------------- MODEL -------------------
+class GenderCNN(nn.Module):
+    def __init__(self, vocab_size, embed_dim=32, num_filters=64):
+        super().__init__()
+        self.embedding = nn.Embedding(vocab_size, embed_dim, padding_idx=0)
+        self.conv1 = nn.Conv1d(embed_dim, num_filters, kernel_size=3, padding=1)
+        self.conv2 = nn.Conv1d(num_filters, num_filters, kernel_size=3, padding=1)
+        self.pool = nn.AdaptiveMaxPool1d(1)
+        self.fc = nn.Linear(num_filters, 1)
+        self.sigmoid = nn.Sigmoid()
+
+    def forward(self, x):
+        x = self.embedding(x)                # (B, L, E)
+        x = x.transpose(1, 2)                # (B, E, L)
+        x = torch.relu(self.conv1(x))
+        x = torch.relu(self.conv2(x))
+        x = self.pool(x).squeeze(-1)         # (B, F)
+        x = self.fc(x).squeeze(-1)           # (B)
+        return self.sigmoid(x)
+
+def load_eager(model_path, vocab_size, device="cpu"):
+    model = GenderCNN(vocab_size).to(device)
+    model.load_state_dict(torch.load(model_path, map_location=device))
+    model.eval()
+    return model
+
+# ------------------- EXPORT -------------------
+def example_input(max_len=MAX_NAME_LEN):
+    return torch.zeros((1, max_len), dtype=torch.long)
+
+def export_torchscript(model, path, max_len=MAX_NAME_LEN):
+    """Trace + freeze the model (weights inlined as constants) and save it."""
+    model = model.cpu().eval()
+    with torch.no_grad():
+        frozen = torch.jit.freeze(torch.jit.trace(model, example_input(max_len)))
+    frozen.save(path)
+    return path
+
+def export_onnx(model, path, max_len=MAX_NAME_LEN):
+    model = model.cpu().eval()
+    torch.onnx.export(
+        model, (example_input(max_len),), path,
+        input_names=["names"], output_names=["prob_female"],
+        dynamic_axes={"names": {0: "batch"}, "prob_female": {0: "batch"}},
+        dynamo=False,
+    )
+    return path
+
+# ------------------- QUANTIZATION -------------------
+def quant_engine():
+    # fbgemm/x86 kernels on Intel/AMD, qnnpack on ARM
+    engines = torch.backends.quantized.supported_engines
+    return next((e for e in ("x86", "fbgemm", "qnnpack") if e in engines), None)
+
+def quantize_int8(model, calibration_batches):
+    """
+    Post-training static int8 quantization (FX graph mode). Conv1d and Linear
+    get int8 weights and activations, calibrated on calibration_batches
+    (iterable of int64 (B, max_len) tensors); the Embedding table is stored
+    as 8-bit weights only. Returns a new module, model is left untouched.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping, float_qparams_weight_only_qconfig
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+    engine = quant_engine()
+    if engine is None:
+        raise RuntimeError("no quantized engine available in this torch build")
+    torch.backends.quantized.engine = engine
+    qconfig_mapping = get_default_qconfig_mapping(engine).set_object_type(nn.Embedding, float_qparams_weight_only_qconfig)
+    float_model = GenderCNN(model.embedding.num_embeddings)
+    float_model.load_state_dict(model.state_dict())
+    prepared = prepare_fx(float_model.eval(), qconfig_mapping, (example_input(),))
+    with torch.no_grad():
+        for x in calibration_batches:
+            prepared(x)
+    return convert_fx(prepared)
+
+# ------------------- FAST MODE (torch.compile + bfloat16) -------------------
+def bf16_supported():
+    # native bf16 matmuls: AVX-512 BF16 or AMX; elsewhere bf16 is emulated and slower than float32
+    cpu = torch.cpu
+    return any(getattr(cpu, check, lambda: False)() for check in ("_is_avx512_bf16_supported", "_is_amx_tile_supported"))
+
+def autocast(bf16):
+    """bfloat16 autocast on CPU when bf16 is True, otherwise a no-op context."""
+    return torch.autocast("cpu", dtype=torch.bfloat16, enabled=bool(bf16))
+
+def compile_model(model, dynamic=None):
+    """torch.compile (inductor) wrapper; compilation happens lazily on the first call."""
+    return torch.compile(model, dynamic=dynamic)
+
+# ------------------- INFERENCE RUNTIMES -------------------
+# Each runtime is a function: int64 array (B, max_len) -> float array (B,) of P(female)
+FLOAT32_RUNTIMES = ("eager", "torchscript", "onnx", "compiled")  # same outputs as the float32 weights
+def eager_runtime(model, device="cpu"):
+    def run(x):
+        with torch.no_grad():
+            return model(torch.from_numpy(x).to(device)).reshape(-1).cpu().numpy()
+    return run
+
+def compiled_runtime(model, bf16=None, max_len=MAX_NAME_LEN):
+    """
+    Eager weights run through torch.compile, under bfloat16 autocast when the
+    CPU supports it (bf16=None) or when forced. Compiles on a warm-up batch
+    here, so a broken toolchain fails at load time and not on first use.
+    """
+    bf16 = bf16_supported() if bf16 is None else bf16
+    module = compile_model(model.cpu().eval(), dynamic=True)  # one graph for every batch size
+    def run(x):
+        with torch.no_grad(), autocast(bf16):
+            return module(torch.from_numpy(x)).float().reshape(-1).numpy()
+    run(np.zeros((2, max_len), dtype=np.int64))
+    return run
+
+def torchscript_runtime(path):
+    if quant_engine() is not None:
+        torch.backends.quantized.engine = quant_engine()  # needed by int8 exports
+    module = torch.jit.optimize_for_inference(torch.jit.load(path, map_location="cpu"))
+    def run(x):
+        with torch.no_grad():
+            return module(torch.from_numpy(x)).reshape(-1).numpy()
+    return run
+
+def onnx_runtime(path):
+    import onnxruntime  # optional dependency
+    session = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+    def run(x):
+        return session.run(None, {"names": x})[0].reshape(-1)
+    return run
+
+def is_fresh(artifact_path, model_path):
+    # an exported artifact is only used if it is at least as new as the weights
+    return os.path.exists(artifact_path) and os.path.getmtime(artifact_path) >= os.path.getmtime(model_path)
+
+def load_runtime(runtime, model, model_path, script_path, onnx_path, int8_path=None):
+    """
+    Pick an inference runtime. runtime is "onnx", "torchscript", "int8",
+    "compiled", "eager" or "auto" (first fresh float artifact: onnx, then
+    torchscript; int8 and compiled are opt-in only). Falls back to eager mode
+    if the requested artifact is missing, stale or fails to load.
+    Returns (name, run).
+    """
+    if runtime == "compiled":
+        try:
+            bf16 = bf16_supported()
+            return ("compiled+bf16" if bf16 else "compiled"), compiled_runtime(model, bf16)
+        except Exception as e:
+            print("Could not compile model, falling back:", e)
+    candidates = {"auto": ["onnx", "torchscript"], "onnx": ["onnx"], "torchscript": ["torchscript"], "int8": ["int8"]}.get(runtime, [])
+    for name in candidates:
+        path = {"onnx": onnx_path, "torchscript": script_path, "int8": int8_path}[name]
+        if not path or not is_fresh(path, model_path):
+            continue
+        try:
+            run = onnx_runtime(path) if name == "onnx" else torchscript_runtime(path)
+            return name, run
+        except Exception as e:
+            print(f"Could not load {name} model ({path}), falling back:", e)
+    return "eager", eager_runtime(model)
+
+# ------------------- EVALUATION -------------------
+def accuracy(run, X, y, batch_size=512, weights=None):
+    """
+    Share of labelled rows whose label matches run()'s prediction. y is the
+    fraction of female labels (1/0 for a single row); weights is how many rows
+    each entry of X stands for (default 1).
+    """
+    X, y = np.asarray(X), np.asarray(y, dtype=np.float64)
+    w = np.ones_like(y) if weights is None else np.asarray(weights, dtype=np.float64)
+    if not w.sum():
+        return 0.0
+    correct = 0.0
+    for start in range(0, len(y), batch_size):
+        female = run(np.ascontiguousarray(X[start:start + batch_size])) >= 0.5
+        yb, wb = y[start:start + batch_size], w[start:start + batch_size]
+        correct += float(np.where(female, yb * wb, (1 - yb) * wb).sum())
+    return correct / w.sum()
+
+# ------------------- BENCHMARK -------------------
+def benchmark(run, X, batch_size, repeats=20):
+    """Median seconds per batch of batch_size rows taken from X."""
+    batch = np.ascontiguousarray(X[:batch_size])
+    run(batch)  # warm-up
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        run(batch)
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times))
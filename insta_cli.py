@@ -0,0 +1,108 @@
+# insta_cli.py
+# Headless follower gender analysis (no tkinter): for cron jobs and servers without a display.
+#   python insta_cli.py --tokens instacreds_123.json instacreds_456.json --format csv --out stats.csv
+#   python insta_cli.py --all --jobs 4
+import argparse
+import contextlib
+import csv
+import glob
+import json
+import os
+import sys
+import insta_core as core
+
+DETAIL_FIELDS = ("account", "username", "name", "gender", "probability")
+
+def load_accounts(token_files):
+    """AccountContext per token file; files without a ds_user_id are reported as failures."""
+    contexts, failures = [], []
+    for tf in token_files:
+        try:
+            ctx = core.AccountContext.from_token_file(tf)
+        except Exception as e:
+            failures.append({"token_file": tf, "error": str(e)})
+            continue
+        if not ctx.ds_user_id:
+            failures.append({"token_file": tf, "error": "no ds_user_id"})
+            continue
+        contexts.append(ctx)
+    return contexts, failures
+
+def run_batch(token_files, jobs=core.ANALYSIS_MAX_PARALLEL, incremental=True):
+    """
+    Analyze every account, jobs at a time. Returns {ds_user_id: stats} and a
+    list of failures (unreadable token files, exceptions, failed fetches).
+    """
+    # the core prints its diagnostics; keep stdout for the JSON/CSV report
+    with contextlib.redirect_stdout(sys.stderr):
+        contexts, failures = load_accounts(token_files)
+        try:
+            results, errors = core.analyze_accounts(contexts, jobs, incremental)
+        finally:
+            for ctx in contexts:
+                ctx.close()
+    # a fetch that ended in a network/HTTP error (e.g. expired tokens) is a failure, not an empty account
+    for account in [a for a, stats in results.items() if stats.get("fetch_status") == "error"]:
+        stats = results.pop(account)
+        failures.append({"token_file": core.token_filename_for(account), "error": f"follower fetch failed after {stats['total']} followers"})
+    for account, stats in results.items():
+        stats["details"] = [dict(zip(DETAIL_FIELDS[1:], d)) for d in stats["details"]]
+        print(f"{account}: {stats['total']} followers ({stats['male']} male, {stats['female']} female, {stats['unknown']} unknown) in {stats['seconds']}s", file=sys.stderr)
+    failures += [{"token_file": core.token_filename_for(account), "error": str(e)} for account, e in errors.items()]
+    return results, failures
+
+def write_json(results, out):
+    json.dump(results, out, ensure_ascii=False, indent=2)
+    out.write("\n")
+
+def write_csv(results, out, summary=False):
+    if summary:
+        fields = ("account", "total", "male", "female", "unknown")
+        writer = csv.DictWriter(out, fieldnames=fields)
+        writer.writeheader()
+        for account, stats in results.items():
+            writer.writerow({"account": account, **{k: stats[k] for k in fields[1:]}})
+        return
+    writer = csv.DictWriter(out, fieldnames=DETAIL_FIELDS)
+    writer.writeheader()
+    for account, stats in results.items():
+        for d in stats["details"]:
+            writer.writerow({"account": account, **d})
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless follower gender analysis for one or more accounts")
+    parser.add_argument("--tokens", nargs="+", default=[], metavar="FILE", help="token files written by the app (instacreds_<ds_user_id>.json)")
+    parser.add_argument("--all", action="store_true", help=f"analyze every {core.TOKEN_FILE_BASE}_*.json in the current folder")
+    parser.add_argument("--format", choices=("json", "csv"), default="json")
+    parser.add_argument("--summary", action="store_true", help="csv: one row per account instead of one per follower")
+    parser.add_argument("--out", help="output file (default: stdout)")
+    parser.add_argument("--jobs", type=int, default=core.ANALYSIS_MAX_PARALLEL, help="accounts analyzed concurrently (they share one loaded model)")
+    parser.add_argument("--full", action="store_true", help="ignore follower snapshots and fetch every page")
+    args = parser.parse_args()
+
+    token_files = list(args.tokens)
+    if args.all:
+        token_files += sorted(glob.glob(f"{core.TOKEN_FILE_BASE}_*.json"))
+    token_files = list(dict.fromkeys(token_files))
+    if not token_files:
+        parser.error("no accounts: pass --tokens FILE ... or --all")
+    missing = [tf for tf in token_files if not os.path.exists(tf)]
+    if missing:
+        parser.error(f"token file(s) not found: {', '.join(missing)}")
+
+    results, failures = run_batch(token_files, max(1, args.jobs), incremental=not args.full)
+    out = open(args.out, "w", encoding="utf-8", newline="") if args.out else sys.stdout
+    try:
+        if args.format == "json":
+            write_json(results, out)
+        else:
+            write_csv(results, out, args.summary)
+    finally:
+        if args.out:
+            out.close()
+    for failure in failures:
+        print(f"FAILED {failure['token_file']}: {failure['error']}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1147 @@
+# insta_core.py
+# Account session, follower fetching, snapshots, gender prediction and caches.
+# No UI code and no tkinter import: shared by app.py (GUI) and insta_cli.py (headless).
+import requests
+import json
+import threading
+import queue
+import time
+import traceback
+import os
+import shutil
+import sqlite3
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+# For local model (torch and gender_model are imported lazily, see load_model)
+from name_encoder import clean_name, load_vocab, build_lookup, encode_names, NameLookup
+
+# ---- Local Model Files (must be in same folder) ----
+MODEL_PATH = "gender_model.pth"
+VOCAB_PATH = "vocab.json"
+SCRIPTED_MODEL_PATH = "gender_model.ts" # frozen TorchScript export (train_gender_model.py)
+ONNX_MODEL_PATH = "gender_model.onnx" # optional ONNX export (train_gender_model.py --onnx)
+INT8_MODEL_PATH = "gender_model_int8.ts" # optional int8 quantized export (train_gender_model.py --quantize)
+NAME_LOOKUP_PATH = "name_lookup.npz" # exact-match labelled names (train_gender_model.py), checked before the model
+NAME_LOOKUP_MIN_CONFIDENCE = 0.75 # names whose labels disagree more than this go to the model instead
+INFERENCE_RUNTIME = "auto" # "auto" (onnx > torchscript > eager), "onnx", "torchscript", "int8", "compiled" (torch.compile + bf16) or "eager"
+DEVICE = "cpu"
+
+# Filled in by load_model() on first use (or by the warm-up thread)
+char_to_idx = {}
+char_lookup = None
+vocab_size = 0
+model = None
+INFERENCE_BACKEND, run_model = None, None
+MODEL_VERSION = ""
+PREDICTION_CACHE = None
+NAME_LOOKUP = None
+INFERENCE = None # InferenceService: the only thread that runs the model
+_model_loaded = False
+_model_lock = threading.Lock()
+
+def model_loaded():
+    return _model_loaded
+
+def load_model():
+    """
+    Import torch and load vocab, weights, inference runtime and the shared
+    prediction cache, once. Safe to call from any thread; callers block until
+    loading is done. Returns True if a model is available.
+    """
+    global char_to_idx, char_lookup, vocab_size, model, INFERENCE_BACKEND, run_model, MODEL_VERSION, PREDICTION_CACHE, NAME_LOOKUP, INFERENCE, _model_loaded
+    with _model_lock:
+        if _model_loaded:
+            return model is not None
+        t0 = time.perf_counter()
+        if os.path.exists(VOCAB_PATH):
+            char_to_idx = load_vocab(VOCAB_PATH)
+        else:
+            print("Error: vocab.json not found. Train the model first.")
+        char_lookup = build_lookup(char_to_idx)
+        vocab_size = len(char_to_idx)
+        # eager weights are always loaded: they define MODEL_VERSION and are the fallback runtime
+        if os.path.exists(MODEL_PATH):
+            from gender_model import load_eager, load_runtime  # imports torch
+            model = load_eager(MODEL_PATH, vocab_size, DEVICE)
+            INFERENCE_BACKEND, run_model = load_runtime(INFERENCE_RUNTIME, model, MODEL_PATH, SCRIPTED_MODEL_PATH, ONNX_MODEL_PATH, INT8_MODEL_PATH)
+            if os.path.exists(NAME_LOOKUP_PATH):
+                try:
+                    NAME_LOOKUP = NameLookup.load(NAME_LOOKUP_PATH)
+                except Exception as e:
+                    print("Failed to load name lookup:", e)
+            # Stamped on every prediction; cached entries with another stamp are stale
+            MODEL_VERSION = model_fingerprint(model.state_dict(), char_to_idx, NAME_LOOKUP_PATH if NAME_LOOKUP is not None else None, INFERENCE_BACKEND)
+            INFERENCE = InferenceService(run_model, char_lookup)
+            try:
+                PREDICTION_CACHE = PredictionCache(PREDICTION_CACHE_FILE, MODEL_VERSION)
+            except Exception as e:
+                print("Failed to open shared prediction cache:", e)
+            print(f"Gender model runtime: {INFERENCE_BACKEND} (loaded in {time.perf_counter() - t0:.2f}s)")
+        else:
+            print("Error: gender_model.pth not found. Train the model first.")
+        _model_loaded = True
+        return model is not None
+
+def model_fingerprint(state_dict, char_to_idx, lookup_path=None, backend=None):
+    """
+    Hash of the weights, vocab, name lookup and, for reduced-precision
+    runtimes (int8, bf16), the runtime: identifies what produced a prediction.
+    """
+    from gender_model import FLOAT32_RUNTIMES
+    h = hashlib.sha256()
+    for key in sorted(state_dict):
+        tensor = state_dict[key].detach().cpu().contiguous()
+        h.update(f"{key}:{tuple(tensor.shape)}:{tensor.dtype}".encode("utf-8"))
+        h.update(tensor.numpy().tobytes())
+    h.update(json.dumps(char_to_idx, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    if lookup_path:
+        with open(lookup_path, "rb") as f:
+            h.update(f.read())
+        h.update(f"lookup>={NAME_LOOKUP_MIN_CONFIDENCE}".encode("utf-8"))
+    if backend and backend not in FLOAT32_RUNTIMES:
+        h.update(f"runtime={backend}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+# ---- Shared inference worker ----
+INFERENCE_MAX_BATCH = 512 # distinct names per forward
+INFERENCE_MAX_WAIT_MS = 2 # how long a non-full micro-batch waits for more requests
+
+class InferenceService:
+    """
+    Long-lived worker thread that owns the model. submit() queues cleaned
+    names and returns one Future (P(female)) per name. Requests from any number
+    of threads are coalesced into micro-batches of up to max_batch names, and a
+    name that is already queued or being scored shares the pending Future
+    instead of being scored twice.
+    """
+    def __init__(self, run, lookup, max_batch=INFERENCE_MAX_BATCH, max_wait_ms=INFERENCE_MAX_WAIT_MS):
+        self.run = run
+        self.lookup = lookup
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.pending = {}  # cleaned name -> Future, while queued or in flight
+        self.lock = threading.Lock()
+        self.batches = self.scored = self.shared = 0
+        self.thread = threading.Thread(target=self._loop, name="inference", daemon=True)
+        self.thread.start()
+
+    def submit(self, names):
+        futures = []
+        with self.lock:
+            for name in names:
+                future = self.pending.get(name)
+                if future is None:
+                    future = self.pending[name] = Future()
+                    self.queue.put(name)
+                else:
+                    self.shared += 1
+                futures.append(future)
+        return futures
+
+    def _next_batch(self):
+        name = self.queue.get()
+        if name is None:
+            return None
+        batch = [name]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                name = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if name is None:
+                self.queue.put(None)  # finish this batch, stop on the next one
+                break
+            batch.append(name)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            with self.lock:
+                futures = [self.pending[name] for name in batch]
+            try:
+                probs = self.run(encode_names(batch, self.lookup, cleaned=True)).tolist()
+                for future, prob in zip(futures, probs):
+                    future.set_result(prob)
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            with self.lock:
+                for name in batch:
+                    self.pending.pop(name, None)
+                self.batches += 1
+                self.scored += len(batch)
+
+    def stats(self):
+        with self.lock:
+            return {"batches": self.batches, "scored": self.scored, "shared": self.shared, "queued": len(self.pending)}
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+PREDICT_BATCH_SIZE = 512
+
+def predict_gender(name: str) -> dict:
+    return predict_gender_batch([name])[0]
+
+def prediction_entry(name, p_female, count=0):
+    gender = "female" if p_female > 0.5 else "male"
+    conf = p_female if gender == "female" else (1 - p_female)
+    return {"name": name, "gender": gender, "probability": round(conf, 3), "count": count, "model": MODEL_VERSION}
+
+def predict_gender_batch(names, batch_size=PREDICT_BATCH_SIZE, progress_callback=None, cancel_event=None):
+    """
+    Predict genders for many names. Distinct cleaned names found in NAME_LOOKUP
+    (labelled training names; count = labelled rows) take their label from it.
+    The rest, unless in the shared PREDICTION_CACHE, go to the INFERENCE
+    worker in chunks of batch_size,
+    where they are coalesced with other callers' requests. Every entry is
+    stamped with MODEL_VERSION. Returns one entry per input name; entries left
+    unscored because cancel_event was set are None.
+    progress_callback(done, total) is called once per chunk.
+    """
+    load_model()
+    total = len(names)
+    results = [None] * total
+    by_name = {}  # cleaned name -> input positions still needing a prediction
+    for idx, name in enumerate(names):
+        if not model or not name or len(name) < 2:
+            results[idx] = {"name": name, "gender": None, "probability": 0, "count": 0, "model": MODEL_VERSION}
+        else:
+            # Clean name (keep Arabic/Unicode letters)
+            by_name.setdefault(clean_name(name), []).append(idx)
+    done = total - sum(len(v) for v in by_name.values())
+    if NAME_LOOKUP is not None and by_name:
+        keys = list(by_name)
+        found, p_female, counts = NAME_LOOKUP.find(keys)
+        for name, hit, prob, count in zip(keys, found.tolist(), p_female.tolist(), counts.tolist()):
+            if hit and max(prob, 1 - prob) >= NAME_LOOKUP_MIN_CONFIDENCE:
+                entry = prediction_entry(name, prob, count)
+                for idx in by_name.pop(name):
+                    results[idx] = entry
+                    done += 1
+    if PREDICTION_CACHE is not None and by_name:
+        for cleaned, entry in PREDICTION_CACHE.get_many(by_name).items():
+            for idx in by_name.pop(cleaned):
+                results[idx] = entry
+                done += 1
+    if progress_callback and done:
+        progress_callback(done, total)
+    pending = list(by_name)
+    for start in range(0, len(pending), batch_size):
+        if cancel_event and cancel_event.is_set():
+            break
+        cleaned = pending[start:start + batch_size]
+        probs = [future.result() for future in INFERENCE.submit(cleaned)]
+        scored = {}
+        for name, prob in zip(cleaned, probs):
+            scored[name] = prediction_entry(name, prob)
+            for idx in by_name[name]:
+                results[idx] = scored[name]
+                done += 1
+        if PREDICTION_CACHE is not None:
+            PREDICTION_CACHE.put_many(scored)
+        if progress_callback:
+            progress_callback(done, total)
+    return results
+
+# ---- DEFAULT TOKENS (prefilled; can be changed in Login modal) ----
+DEFAULT_CSRFTOKEN = ""
+DEFAULT_SESSIONID = ""
+DEFAULT_DS_USER_ID = ""
+
+# ---- Filenames base (per-account) ----
+TOKEN_FILE_BASE = "instacreds" # instacreds_<ds_user_id>.json
+GENDER_CACHE_BASE = "gender_cache" # gender_cache_<ds_user_id>.sqlite3 (or .json)
+GENDER_CACHE_BACKEND = "sqlite" # "sqlite" (default) or "json" (legacy whole-file rewrite)
+PREDICTION_CACHE_FILE = "prediction_cache.sqlite3" # shared by all accounts, keyed by model version
+PREDICTION_LRU_SIZE = 50000 # predictions kept in memory
+
+# ---- Requests session defaults (each AccountContext gets its own session) ----
+SESSION_HEADERS = {
+"User-Agent": "Instagram 155.0.0.37.107",
+"x-requested-with": "XMLHttpRequest",
+"referer": "https://www.instagram.com/",
+"accept": "*/*",
+"accept-language": "en-US,en;q=0.9",
+"content-type": "application/x-www-form-urlencoded; charset=UTF-8",
+}
+
+# ---- Helpers: filenames per account ----
+def token_filename_for(ds_user_id):
+    return f"{TOKEN_FILE_BASE}_{ds_user_id}.json" if ds_user_id else f"{TOKEN_FILE_BASE}.json"
+
+def cache_filename_for(ds_user_id, ext=None):
+    ext = ext or (".sqlite3" if GENDER_CACHE_BACKEND == "sqlite" else ".json")
+    return f"{GENDER_CACHE_BASE}_{ds_user_id}{ext}" if ds_user_id else f"{GENDER_CACHE_BASE}{ext}"
+
+# ---- Persist & apply tokens (GUI account) ----
+def apply_tokens(csrftoken, sessionid, ds_user_id, save=True):
+    """Switch the GUI account (ACCOUNT) to new tokens, optionally save them, and open its cache."""
+    ACCOUNT.set_tokens(csrftoken, sessionid, ds_user_id)
+    if save:
+        ACCOUNT.save_tokens()
+    ACCOUNT.open_cache()
+
+def load_tokens_if_exist():
+    candidates = []
+    if DEFAULT_DS_USER_ID:
+        candidates.append(token_filename_for(DEFAULT_DS_USER_ID))
+    candidates.append(token_filename_for(""))
+    for tf in candidates:
+        if os.path.exists(tf):
+            try:
+                with open(tf, "r", encoding="utf-8") as f:
+                    d = json.load(f)
+                apply_tokens(d.get("csrftoken", ACCOUNT.csrftoken), d.get("sessionid", ACCOUNT.sessionid), d.get("ds_user_id", ACCOUNT.ds_user_id))
+                return
+            except Exception:
+                continue
+    # if nothing found, apply defaults but don't save
+    apply_tokens(ACCOUNT.csrftoken, ACCOUNT.sessionid, ACCOUNT.ds_user_id, save=False)
+
+# ---- Genderize cache (per-account) ----
+class JsonGenderCache:
+    """Legacy backend: the whole file is parsed at open and rewritten on flush."""
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = {k.lower(): v for k, v in json.load(f).items()}
+            except Exception:
+                self.entries = {}
+
+    def get_many(self, keys):
+        return {k: self.entries[k] for k in keys if k in self.entries}
+
+    def upsert_many(self, entries):
+        if entries:
+            self.entries.update(entries)
+            self.dirty = True
+
+    def flush(self):
+        if not self.dirty:
+            return
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        self.dirty = False
+
+    def close(self):
+        self.flush()
+
+def open_sqlite(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+class SqliteGenderCache:
+    """
+    SQLite backend (WAL mode): lookups only touch the requested keys and
+    upserts are incremental, so neither startup nor saves scale with cache size.
+    """
+    QUERY_CHUNK = 500  # stay under SQLite's bound-parameter limit
+
+    def __init__(self, path, migrate_from=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = open_sqlite(path)
+        with self.lock, self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if migrate_from:
+            self._migrate_json(migrate_from)
+
+    def _migrate_json(self, json_path):
+        # one-time import of a legacy gender_cache_<id>.json (the file itself is left in place)
+        with self.lock:
+            done = self.conn.execute("SELECT value FROM meta WHERE key = 'migrated_json'").fetchone()
+        if done or not os.path.exists(json_path):
+            return
+        legacy = JsonGenderCache(json_path)
+        self.upsert_many(legacy.entries)
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_json', ?)", (json_path,))
+        print(f"Migrated {len(legacy.entries)} cache entries from {json_path}")
+
+    def get_many(self, keys):
+        keys = list(keys)
+        found = {}
+        with self.lock:
+            for start in range(0, len(keys), self.QUERY_CHUNK):
+                chunk = keys[start:start + self.QUERY_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                for key, value in self.conn.execute(f"SELECT key, value FROM entries WHERE key IN ({marks})", chunk):
+                    found[key] = json.loads(value)
+        return found
+
+    def upsert_many(self, entries):
+        if not entries:
+            return
+        rows = [(k, json.dumps(v, ensure_ascii=False)) for k, v in entries.items()]
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO entries (key, value) VALUES (?, ?)", rows)
+
+    def flush(self):
+        pass  # every upsert is committed
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+# ---- Shared prediction cache (all accounts) ----
+class PredictionCache:
+    """
+    Model predictions keyed by (model version, cleaned name), shared by every
+    account: a bounded in-memory LRU in front of one SQLite table.
+    """
+    def __init__(self, path, model_version, capacity=PREDICTION_LRU_SIZE):
+        self.model_version = model_version
+        self.capacity = capacity
+        self.lru = OrderedDict()
+        self.hits = 0       # served from memory
+        self.disk_hits = 0  # served from SQLite
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = open_sqlite(path)
+        with self.lock, self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS predictions (model TEXT NOT NULL, name TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (model, name))")
+            # rows written by older models can never be served again
+            self.conn.execute("DELETE FROM predictions WHERE model != ?", (model_version,))
+
+    def _remember(self, name, entry):
+        self.lru[name] = entry
+        self.lru.move_to_end(name)
+        if len(self.lru) > self.capacity:
+            self.lru.popitem(last=False)
+
+    def get_many(self, names):
+        found = {}
+        missing = []
+        with self.lock:
+            for name in names:
+                entry = self.lru.get(name)
+                if entry is None:
+                    missing.append(name)
+                else:
+                    self.lru.move_to_end(name)
+                    found[name] = entry
+            self.hits += len(found)
+            from_disk = 0
+            for start in range(0, len(missing), SqliteGenderCache.QUERY_CHUNK):
+                chunk = missing[start:start + SqliteGenderCache.QUERY_CHUNK]
+                marks = ",".join("?" * len(chunk))
+                rows = self.conn.execute(f"SELECT name, value FROM predictions WHERE model = ? AND name IN ({marks})", [self.model_version] + chunk)
+                for name, value in rows:
+                    entry = json.loads(value)
+                    found[name] = entry
+                    self._remember(name, entry)
+                    from_disk += 1
+            self.disk_hits += from_disk
+            self.misses += len(missing) - from_disk
+        return found
+
+    def put_many(self, entries):
+        if not entries:
+            return
+        rows = [(self.model_version, k, json.dumps(v, ensure_ascii=False)) for k, v in entries.items()]
+        with self.lock:
+            for name, entry in entries.items():
+                self._remember(name, entry)
+            with self.conn:
+                self.conn.executemany("INSERT OR REPLACE INTO predictions (model, name, value) VALUES (?, ?, ?)", rows)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "size": len(self.lru)}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def open_gender_cache(ds_user_id):
+    if GENDER_CACHE_BACKEND == "sqlite":
+        return SqliteGenderCache(cache_filename_for(ds_user_id), migrate_from=cache_filename_for(ds_user_id, ".json"))
+    return JsonGenderCache(cache_filename_for(ds_user_id))
+
+def cache_files_for(ds_user_id):
+    # everything "Clear tokens & cache" must delete, whichever backend wrote it
+    db = cache_filename_for(ds_user_id, ".sqlite3")
+    return [cache_filename_for(ds_user_id, ".json"), db, db + "-wal", db + "-shm"]
+
+# ---- Per-account context ----
+class AccountContext:
+    """
+    One Instagram account: tokens, its own requests session and headers, and
+    its gender cache handle. Contexts share nothing but the model and the
+    prediction cache, so several accounts can be analyzed at the same time.
+    """
+    def __init__(self, csrftoken="", sessionid="", ds_user_id=""):
+        self.session = requests.Session()
+        self.session.headers.update(SESSION_HEADERS)
+        self.gender_cache = None
+        self.set_tokens(csrftoken, sessionid, ds_user_id)
+
+    @classmethod
+    def from_token_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            d = json.load(f)
+        return cls(d.get("csrftoken", ""), d.get("sessionid", ""), d.get("ds_user_id", ""))
+
+    def set_tokens(self, csrftoken, sessionid, ds_user_id):
+        self.csrftoken = csrftoken or ""
+        self.sessionid = sessionid or ""
+        self.ds_user_id = ds_user_id or ""
+        # set/clear cookies in requests session
+        for name, value in (("sessionid", self.sessionid), ("csrftoken", self.csrftoken), ("ds_user_id", self.ds_user_id)):
+            try:
+                if value:
+                    self.session.cookies.set(name, value, domain=".instagram.com")
+                else:
+                    self.session.cookies.clear(domain=".instagram.com", name=name)
+            except Exception:
+                pass
+        self.base_headers = {
+"x-csrftoken": self.csrftoken,
+"User-Agent": self.session.headers.get("User-Agent"),
+"Referer": "https://www.instagram.com/"
+        }
+
+    def save_tokens(self):
+        # save tokens to per-account file
+        try:
+            with open(token_filename_for(self.ds_user_id), "w", encoding="utf-8") as f:
+                json.dump({"csrftoken": self.csrftoken, "sessionid": self.sessionid, "ds_user_id": self.ds_user_id}, f)
+        except Exception as e:
+            print("Failed to save tokens:", e)
+
+    def open_cache(self):
+        self.close_cache()
+        try:
+            self.gender_cache = open_gender_cache(self.ds_user_id)
+        except Exception as e:
+            print("Failed to open gender cache, falling back to JSON:", e)
+            self.gender_cache = JsonGenderCache(cache_filename_for(self.ds_user_id, ".json"))
+        return self.gender_cache
+
+    def flush_cache(self):
+        try:
+            self.gender_cache.flush()
+        except Exception as e:
+            print("Failed to save gender cache:", e)
+
+    def close_cache(self):
+        if self.gender_cache is None:
+            return
+        try:
+            self.gender_cache.close()
+        except Exception as e:
+            print("Failed to close gender cache:", e)
+        self.gender_cache = None
+
+    def close(self):
+        self.close_cache()
+        self.session.close()
+
+# The account shown in the GUI; functions below use it when no ctx is passed
+ACCOUNT = AccountContext(DEFAULT_CSRFTOKEN, DEFAULT_SESSIONID, DEFAULT_DS_USER_ID)
+
+# ---- Instagram helpers ----
+GRAPHQL_URL = "https://www.instagram.com/graphql/query/" # point at a local stub server for testing
+PAGE_DELAY = 1 # seconds between pages of one edge traversal
+
+FOLLOWING_HASH = "3dec7e2c57367ef3da3d987d89f9dbc8"
+FOLLOWERS_HASH = "c76146de99bb02f6415203be841dd25a"
+
+def iter_user_pages(query_hash, user_id, edge_type, state=None, ctx=None):
+    """
+    Yield each page of users as soon as it arrives, requested with ctx's
+    session (default: ACCOUNT). If given, the state dict
+    is updated with "total" (edge count reported by Instagram), "has_next"
+    and, once paging ends, "status": "complete" or "error" (network/HTTP/parse
+    failure). Closing the generator early stops paging without a final delay.
+    """
+    state = state if state is not None else {}
+    ctx = ctx or ACCOUNT
+    url = GRAPHQL_URL
+    has_next = True
+    end_cursor = None
+    while has_next:
+        if end_cursor:
+            time.sleep(PAGE_DELAY)
+        variables = {
+            "id": user_id,
+            "include_reel": True,
+            "fetch_mutual": False,
+            "first": 50
+        }
+        if end_cursor:
+            variables["after"] = end_cursor
+        full_url = f"{url}?query_hash={query_hash}&variables={json.dumps(variables)}"
+        try:
+            res = ctx.session.get(full_url, headers=ctx.base_headers, timeout=15)
+        except Exception as e:
+            print("Network error fetching users:", e)
+            state["status"] = "error"
+            return
+        if res.status_code != 200:
+            print(f"Non-200 while fetching users: {res.status_code} - {res.text[:200]}")
+            state["status"] = "error"
+            return
+        try:
+            data = res.json()["data"]["user"][edge_type]
+        except Exception as e:
+            print("Failed to parse JSON while fetching users:", e)
+            state["status"] = "error"
+            return
+        if data.get("count") is not None:
+            state["total"] = data["count"]
+        edges = data.get("edges", [])
+        page = []
+        for edge in edges:
+            node = edge.get("node", {})
+            page.append({
+                "id": node.get("id"),
+                "username": node.get("username"),
+                "full_name": node.get("full_name")
+            })
+        page_info = data.get("page_info", {})
+        has_next = page_info.get("has_next_page", False)
+        end_cursor = page_info.get("end_cursor")
+        state["has_next"] = has_next
+        yield page
+    state["status"] = "complete"
+
+def fetch_users(query_hash, user_id, edge_type, ctx=None):
+    results = []
+    for page in iter_user_pages(query_hash, user_id, edge_type, ctx=ctx):
+        results.extend(page)
+    return results
+
+# ---- Follower snapshots (per-account, for delta scans) ----
+SNAPSHOT_DIR = "snapshots" # snapshots/<ds_user_id>/<edge_type>/<unix_ms>.json
+SNAPSHOT_KEEP = 5 # snapshots kept per account and edge
+SNAPSHOT_MAX_AGE = 24 * 3600 # older snapshots force a full scan (catches unfollows deep in the list)
+
+def snapshot_root_for(ds_user_id):
+    return os.path.join(SNAPSHOT_DIR, ds_user_id or "default")
+
+def snapshot_dir_for(ds_user_id, edge_type):
+    return os.path.join(snapshot_root_for(ds_user_id), edge_type)
+
+def load_latest_snapshot(ds_user_id, edge_type):
+    folder = snapshot_dir_for(ds_user_id, edge_type)
+    if not os.path.isdir(folder):
+        return None
+    for fname in sorted(os.listdir(folder), reverse=True):
+        if not fname.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(folder, fname), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            continue
+    return None
+
+def save_snapshot(ds_user_id, edge_type, users):
+    folder = snapshot_dir_for(ds_user_id, edge_type)
+    taken_at = time.time()
+    path = os.path.join(folder, f"{int(taken_at * 1000)}.json")
+    try:
+        os.makedirs(folder, exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"taken_at": taken_at, "users": users}, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+        old = sorted(n for n in os.listdir(folder) if n.endswith(".json"))[:-SNAPSHOT_KEEP]
+        for fname in old:
+            os.remove(os.path.join(folder, fname))
+    except Exception as e:
+        print("Failed to save snapshot:", e)
+
+def remove_from_latest_snapshot(ds_user_id, edge_type, user_id):
+    """Drop user_id from the newest snapshot (e.g. after an unfollow), so a delta scan cannot bring it back."""
+    folder = snapshot_dir_for(ds_user_id, edge_type)
+    if not os.path.isdir(folder):
+        return
+    names = sorted((n for n in os.listdir(folder) if n.endswith(".json")), reverse=True)
+    if not names:
+        return
+    path = os.path.join(folder, names[0])
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        users = [u for u in snapshot.get("users", []) if u.get("id") != user_id]
+        if len(users) == len(snapshot.get("users", [])):
+            return
+        snapshot["users"] = users
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+    except Exception as e:
+        print("Failed to update snapshot:", e)
+
+def clear_snapshots(ds_user_id):
+    """Delete every snapshot of an account (they are cached follower lists)."""
+    shutil.rmtree(snapshot_root_for(ds_user_id), ignore_errors=True)
+
+def snapshot_delta(previous, current):
+    prev_ids = {u.get("id") for u in previous}
+    cur_ids = {u.get("id") for u in current}
+    return {
+"added": [u for u in current if u.get("id") not in prev_ids],
+"removed": [u for u in previous if u.get("id") not in cur_ids],
+    }
+
+def iter_users_incremental(query_hash, user_id, edge_type, incremental=True, state=None, ctx=None):
+    """
+    Yield an edge page by page, reusing the latest snapshot: paging stops at
+    the first page whose users appear, in the same order, in the previous
+    snapshot, and the rest of that snapshot is yielded as one final chunk.
+    The shortcut is only taken if the merged list has as many users as the
+    edge count Instagram reports; otherwise paging goes on (full traversal),
+    since users were removed or added below that page.
+    When the traversal finishes, it is saved as the new snapshot and
+    state["delta"] holds the users added/removed since the previous one
+    (None without a snapshot, or if paging failed partway). state also carries iter_user_pages' fields.
+    """
+    state = state if state is not None else {}
+    snapshot = load_latest_snapshot(user_id, edge_type)
+    if snapshot and time.time() - snapshot.get("taken_at", 0) > SNAPSHOT_MAX_AGE:
+        incremental = False
+    previous = snapshot["users"] if snapshot else None
+    if previous is not None:
+        state.setdefault("total", len(previous))
+    prev_ids = [u.get("id") for u in previous] if (incremental and previous) else []
+    prev_pos = {uid: i for i, uid in enumerate(prev_ids)}
+    users = []
+    seen = set()
+    pages = iter_user_pages(query_hash, user_id, edge_type, state, ctx)
+    for page in pages:
+        users.extend(page)
+        seen.update(u.get("id") for u in page)
+        yield page
+        start = prev_pos.get(page[0].get("id")) if (page and state.get("has_next")) else None
+        if start is not None and prev_ids[start:start + len(page)] == [u.get("id") for u in page]:
+            tail = [u for u in previous[start + len(page):] if u.get("id") not in seen]
+            if len(users) + len(tail) != state.get("total"):
+                continue  # stale tail: keep paging
+            pages.close()
+            users.extend(tail)
+            state["status"] = "stopped"
+            if tail:
+                yield tail
+            break
+    state["delta"] = None
+    if state.get("status") in ("complete", "stopped"):
+        save_snapshot(user_id, edge_type, users)
+        if previous is not None:
+            state["delta"] = snapshot_delta(previous, users)
+
+def fetch_users_incremental(query_hash, user_id, edge_type, incremental=True, ctx=None):
+    """Whole-list version of iter_users_incremental: returns (users, delta)."""
+    state = {}
+    users = []
+    for chunk in iter_users_incremental(query_hash, user_id, edge_type, incremental, state, ctx):
+        users.extend(chunk)
+    return users, state.get("delta")
+
+# ---- Compact user table ----
+class UserRecord:
+    __slots__ = ("id", "username", "full_name")
+
+    def __init__(self, id, username, full_name):
+        self.id = id
+        self.username = username
+        self.full_name = full_name
+
+    # dict-style access, so records work wherever user dicts did
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in UserRecord.__slots__ else None
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        if key not in UserRecord.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def to_dict(self):
+        return {"id": self.id, "username": self.username, "full_name": self.full_name}
+
+class UserTable:
+    """
+    Users as __slots__ records plus an id -> row index. Membership, lookup and
+    removal are O(1): removed rows are only marked dead, and iteration/len()
+    skip them.
+    """
+    __slots__ = ("rows", "alive", "index", "count")
+
+    def __init__(self, users=()):
+        self.rows = []
+        self.alive = bytearray()
+        self.index = {}
+        self.count = 0
+        for u in users:
+            self.append(u)
+
+    def append(self, user):
+        if not isinstance(user, UserRecord):
+            user = UserRecord(user.get("id"), user.get("username"), user.get("full_name"))
+        if user.id is not None and user.id in self.index:
+            return
+        if user.id is not None:
+            self.index[user.id] = len(self.rows)
+        self.rows.append(user)
+        self.alive.append(1)
+        self.count += 1
+
+    def get(self, user_id, default=None):
+        row = self.index.get(user_id)
+        return self.rows[row] if row is not None else default
+
+    def remove(self, user_id):
+        row = self.index.pop(user_id, None)
+        if row is None:
+            return False
+        self.alive[row] = 0
+        self.count -= 1
+        return True
+
+    def __contains__(self, user_id):
+        return user_id in self.index
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        alive = self.alive
+        return (rec for i, rec in enumerate(self.rows) if alive[i])
+
+def scan_account(incremental=True, ctx=None, progress_callback=None):
+    """
+    Fetch following and followers and compute the non-followers.
+    progress_callback(done, total) gets the users fetched so far over both
+    edges, once per page (from the two fetch threads). "following_status" /
+    "followers_status" are the edges' iter_users_incremental statuses: with
+    "error" the lists are partial and the non-followers unreliable.
+    """
+    ctx = ctx or ACCOUNT
+    states = {"edge_follow": {}, "edge_followed_by": {}}
+    fetched = dict.fromkeys(states, 0)
+    def fetch(query_hash, edge_type):
+        users = []
+        for chunk in iter_users_incremental(query_hash, ctx.ds_user_id, edge_type, incremental, states[edge_type], ctx):
+            users.extend(chunk)
+            fetched[edge_type] = len(users)
+            if progress_callback:
+                progress_callback(sum(fetched.values()), sum(st.get("total") or 0 for st in states.values()))
+        return users, states[edge_type].get("delta"), states[edge_type].get("status")
+    # both edges are paged at the same time; each keeps its own PAGE_DELAY pacing
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        following_job = pool.submit(fetch, FOLLOWING_HASH, "edge_follow")
+        followers_job = pool.submit(fetch, FOLLOWERS_HASH, "edge_followed_by")
+        following, following_delta, following_status = following_job.result()
+        followers, followers_delta, followers_status = followers_job.result()
+    follower_usernames = {u["username"] for u in followers if u.get("username")}
+    nonfollowers = UserTable(u for u in following if u.get("username") not in follower_usernames)
+    return {
+"following": following,
+"followers": followers,
+"nonfollowers": nonfollowers,
+"followers_delta": followers_delta,
+"following_delta": following_delta,
+"followers_status": followers_status,
+"following_status": following_status,
+    }
+
+# ---- Search index for the non-follower list ----
+class UserSearchIndex:
+    """
+    Trigram index over lowercased username and full_name. Queries of three or
+    more characters only verify rows holding all of the query's trigrams;
+    shorter queries scan the precomputed lowercase strings.
+    """
+    def __init__(self, users):
+        self.users = list(users)
+        # "\n" keeps a match from spanning username and full_name
+        self.texts = [f"{(u.get('username') or '').lower()}\n{(u.get('full_name') or '').lower()}" for u in self.users]
+        self.grams = {}
+        for row, text in enumerate(self.texts):
+            for gram in {text[i:i + 3] for i in range(len(text) - 2)}:
+                self.grams.setdefault(gram, []).append(row)
+
+    def search(self, query):
+        q = query.lower()
+        if not q:
+            return list(self.users)
+        if len(q) < 3:
+            rows = range(len(self.texts))
+        else:
+            postings = []
+            for i in range(len(q) - 2):
+                posting = self.grams.get(q[i:i + 3])
+                if posting is None:
+                    return []
+                postings.append(posting)
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    return []
+            rows = sorted(candidates)
+        return [self.users[row] for row in rows if q in self.texts[row]]
+
+def get_nonfollowers(incremental=True, ctx=None):
+    return scan_account(incremental, ctx)["nonfollowers"]
+
+def fetch_followers_list(incremental=True, ctx=None):
+    ctx = ctx or ACCOUNT
+    followers, _ = fetch_users_incremental(FOLLOWERS_HASH, ctx.ds_user_id, "edge_followed_by", incremental, ctx)
+    return followers
+
+def unfollow_user(user_id, ctx=None):
+    ctx = ctx or ACCOUNT
+    url = f"https://www.instagram.com/web/friendships/{user_id}/unfollow/"
+    try:
+        res = ctx.session.post(url, headers={"x-csrftoken": ctx.csrftoken, "Referer": "https://www.instagram.com/"}, timeout=15)
+    except Exception as e:
+        return False, None, f"Network exception: {e}"
+    code = res.status_code
+    text = res.text
+    success = False
+    try:
+        j = res.json()
+        success = (j.get("status") == "ok")
+    except Exception:
+        success = (code == 200)
+    if success:
+        remove_from_latest_snapshot(ctx.ds_user_id, "edge_follow", user_id)
+    return success, code, text
+
+# ---- Prepare name for model ----
+def prepare_name_for_genderize(user):
+    """
+    Extract a sensible first-name token from the user's full_name or username.
+    Normalizes common separators (underscore, dot, dash) into spaces so names
+    like "Ghazi_sdi", "john.doe" or "mary-jane" yield "Ghazi", "john" and "mary".
+    """
+    def normalize_and_first_token(s):
+        if not s:
+            return ""
+        # replace common non-letter separators with space
+        for sep in ("_", ".", "-", "/"):
+            s = s.replace(sep, " ")
+        s = s.strip()
+        if not s:
+            return ""
+        # take the first whitespace-separated token
+        first = s.split()[0]
+        # keep only alphabetic characters (protects against numbers/symbols)
+        cleaned = ''.join([c for c in first if c.isalpha() or '\u0600' <= c <= '\u06FF'])  # Keep Arabic
+        return cleaned or first
+
+    full_name = (user.get("full_name") or "").strip()
+    if full_name:
+        token = normalize_and_first_token(full_name)
+        return token[:50]
+
+    username = (user.get("username") or "").strip()
+    if username:
+        token = normalize_and_first_token(username)
+        return token[:50] if token else username[:50]
+    return ""
+
+# ---- Local Gender Prediction with Cache ----
+def genderize_with_cache(names, progress_callback=None, cancel_event=None, ctx=None):
+    load_model()  # MODEL_VERSION is needed to tell fresh cache entries from stale ones
+    ctx = ctx or ACCOUNT
+    if ctx.gender_cache is None:
+        ctx.open_cache()
+    results = []
+    total = len(names)
+    done = 0
+    to_lookup = []
+    lookup_indices = []
+    keys = [(n or "").lower() for n in names]
+    cached = ctx.gender_cache.get_many(set(keys))
+    for idx, n in enumerate(names):
+        nkey = keys[idx]
+        entry = cached.get(nkey)
+        if entry is not None and entry.get("model") == MODEL_VERSION:
+            results.append(entry)
+            done += 1
+        else:
+            # miss, or stale (scored by another model): the stale value is kept
+            # as a fallback in case re-scoring gets canceled
+            results.append(entry)
+            to_lookup.append(n)
+            lookup_indices.append(idx)
+
+    if progress_callback and done:
+        progress_callback(done, total)
+
+    # Score every cache miss and stale entry in batched forwards
+    cached_done = done
+    def batch_progress(batch_done, batch_total):
+        if progress_callback:
+            progress_callback(cached_done + batch_done, total)
+    entries = predict_gender_batch(to_lookup, progress_callback=batch_progress, cancel_event=cancel_event)
+    new_entries = {}
+    for original_idx, entry in zip(lookup_indices, entries):
+        if entry is None:
+            continue
+        new_entries[keys[original_idx]] = entry
+        results[original_idx] = entry
+    ctx.gender_cache.upsert_many(new_entries)
+    ctx.flush_cache()
+
+    # Fill any None
+    for idx, item in enumerate(results):
+        if item is None:
+            n = names[idx]
+            results[idx] = {"name": n, "gender": None, "probability": 0, "count": 0}
+
+    return results
+
+# ---- Follower gender stats ----
+def names_for_users(users):
+    names = []
+    for u in users:
+        name = prepare_name_for_genderize(u)
+        if not name:
+            name = u.get("username") or ""
+        names.append(name)
+    return names
+
+def new_gender_stats():
+    return {"total": 0, "male": 0, "female": 0, "unknown": 0, "details": [], "canceled": False}
+
+def tally_genders(stats, users, results):
+    """Add one page of genderize results to a running stats dict."""
+    for user, r in zip(users, results):
+        gender = r.get("gender")
+        if gender == "male":
+            stats["male"] += 1
+        elif gender == "female":
+            stats["female"] += 1
+        else:
+            stats["unknown"] += 1
+        stats["details"].append((user.get("username"), r.get("name"), gender, r.get("probability") or 0))
+    stats["total"] += len(results)
+    return stats
+
+# ---- Progress reporting ----
+PROGRESS_INTERVAL = 0.1 # seconds between progress flushes to the UI
+
+class ProgressReporter:
+    """
+    Coalesces progress from worker threads. update()/advance() may be called
+    for every item; emit(progress) runs at most once per interval (and always
+    on finish()), so a UI only sees a bounded stream of updates. progress is a
+    dict: done, total, elapsed, rate (items/s) and eta (seconds, None if
+    unknown).
+    """
+    def __init__(self, emit, interval=PROGRESS_INTERVAL):
+        self.emit = emit
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.last_emit = 0.0
+        self.done = 0
+        self.total = 0
+
+    def update(self, done, total=None):
+        with self.lock:
+            self.done = done
+            if total is not None:
+                self.total = total
+            progress = self._due()
+        if progress:
+            self.emit(progress)
+
+    def advance(self, n=1):
+        with self.lock:
+            self.done += n
+            progress = self._due()
+        if progress:
+            self.emit(progress)
+
+    def finish(self):
+        with self.lock:
+            progress = self._snapshot(time.monotonic())
+        self.emit(progress)
+
+    def _due(self):
+        now = time.monotonic()
+        if now - self.last_emit < self.interval:
+            return None
+        self.last_emit = now
+        return self._snapshot(now)
+
+    def _snapshot(self, now):
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - self.done) / rate if (rate > 0 and self.total >= self.done) else None
+        return {"done": self.done, "total": max(self.total, self.done), "elapsed": elapsed, "rate": rate, "eta": eta}
+
+def format_progress(progress, unit="items"):
+    """One-line summary, e.g. "1200 / 5000 · 350 items/s · ETA 11s"."""
+    text = f"{progress['done']} / {progress['total']}"
+    if progress["rate"] > 0:
+        text += f" · {progress['rate']:.0f} {unit}/s" if progress["rate"] >= 10 else f" · {progress['rate']:.2f} {unit}/s"
+    if progress["eta"] is not None and progress["done"] < progress["total"]:
+        eta = int(progress["eta"])
+        text += f" · ETA {eta // 60}m{eta % 60:02d}s" if eta >= 60 else f" · ETA {eta}s"
+    return text
+
+# ---- Multi-account analysis ----
+ANALYSIS_MAX_PARALLEL = 4 # accounts analyzed at the same time by analyze_accounts
+
+def analyze_followers(ctx, incremental=True, cancel_event=None):
+    """
+    Fetch ctx's followers page by page and tally their predicted genders, like
+    the dashboard does for the GUI account. Returns the tally_genders stats
+    plus "fetch_status" and "seconds".
+    """
+    t0 = time.perf_counter()
+    fetch_state = {}
+    stats = new_gender_stats()
+    for page in iter_users_incremental(FOLLOWERS_HASH, ctx.ds_user_id, "edge_followed_by", incremental, fetch_state, ctx):
+        if cancel_event and cancel_event.is_set():
+            break
+        results = genderize_with_cache(names_for_users(page), cancel_event=cancel_event, ctx=ctx)
+        tally_genders(stats, page, results)
+    stats["canceled"] = bool(cancel_event and cancel_event.is_set())
+    stats["fetch_status"] = fetch_state.get("status")
+    stats["seconds"] = round(time.perf_counter() - t0, 2)
+    return stats
+
+def analyze_accounts(contexts, max_parallel=ANALYSIS_MAX_PARALLEL, incremental=True, cancel_event=None):
+    """
+    Run analyze_followers for every AccountContext, max_parallel accounts at a
+    time. Each account pages with its own session and pacing; all of them
+    share the loaded model and the prediction cache.
+    Returns ({ds_user_id: stats}, {ds_user_id: exception}).
+    """
+    load_model()  # once, before the workers race for it
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as pool:
+        jobs = {pool.submit(analyze_followers, ctx, incremental, cancel_event): ctx for ctx in contexts}
+        for job in as_completed(jobs):
+            ctx = jobs[job]
+            try:
+                results[ctx.ds_user_id] = job.result()
+            except Exception as e:
+                traceback.print_exc()
+                errors[ctx.ds_user_id] = e
+    return results, errors
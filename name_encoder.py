@@ -0,0 +1,79 @@
+# name_encoder.py
+# Shared name cleaning + vectorized encoding + exact-match name lookup (used by training, testing and the app)
+import json
+import re
+import numpy as np
+
+MAX_NAME_LEN = 20
+
+# Keep latin + Arabic letters and spaces; everything else is dropped
+CLEAN_PATTERN = r'[^a-zA-Z\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF ]'
+_CLEAN_RE = re.compile(CLEAN_PATTERN)
+
+def clean_name(name, max_len=MAX_NAME_LEN):
+    return _CLEAN_RE.sub('', (name or "").lower())[:max_len]
+
+def load_vocab(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def build_lookup(char_to_idx):
+    """
+    Build a codepoint -> index table from a vocab dict. Codepoints that are not
+    in the vocab (and the padding codepoint 0) map to index 0.
+    """
+    chars = [c for c in char_to_idx if len(c) == 1]
+    size = max((ord(c) for c in chars), default=0) + 1
+    lookup = np.zeros(size, dtype=np.int64)
+    for c in chars:
+        lookup[ord(c)] = char_to_idx[c]
+    return lookup
+
+def encode_names(names, lookup, max_len=MAX_NAME_LEN, cleaned=False):
+    """
+    Encode a list of names into an (N, max_len) int64 array in one pass.
+    Names are cleaned with clean_name unless cleaned=True; shorter names are
+    zero padded, longer ones truncated.
+    """
+    if not cleaned:
+        names = [clean_name(n, max_len) for n in names]
+    if not len(names):
+        return np.zeros((0, max_len), dtype=np.int64)
+    # Fixed-width UTF-32 array: truncation and zero padding come for free
+    codepoints = np.asarray(names, dtype=f'<U{max_len}').view(np.uint32).reshape(len(names), max_len)
+    in_range = codepoints < len(lookup)
+    return np.where(in_range, lookup[np.where(in_range, codepoints, 0)], 0)
+
+class NameLookup:
+    """
+    Exact-match table of labelled names: sorted cleaned names with their
+    P(female) and row count, probed for a whole batch with one searchsorted.
+    """
+    def __init__(self, names, p_female, counts, max_len=MAX_NAME_LEN):
+        order = np.argsort(names)
+        self.names = np.asarray(names, dtype=f'<U{max_len}')[order]
+        self.p_female = np.asarray(p_female, dtype=np.float32)[order]
+        self.counts = np.asarray(counts, dtype=np.int32)[order]
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["names"], data["p_female"], data["counts"])
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, names=self.names, p_female=self.p_female, counts=self.counts)
+
+    def find(self, cleaned_names):
+        """
+        Look up already-cleaned names. Returns (found, p_female, counts) arrays
+        aligned with the input; p_female/counts are only meaningful where found.
+        """
+        keys = np.asarray(cleaned_names, dtype=self.names.dtype)
+        if not len(self.names) or not len(keys):
+            return np.zeros(len(keys), dtype=bool), np.zeros(len(keys), dtype=np.float32), np.zeros(len(keys), dtype=np.int32)
+        idx = np.minimum(np.searchsorted(self.names, keys), len(self.names) - 1)
+        return self.names[idx] == keys, self.p_female[idx], self.counts[idx]
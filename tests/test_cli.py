@@ -0,0 +1,37 @@
+# tests/test_cli.py
+import csv
+import io
+import json
+import sys
+import insta_cli
+import insta_core as core
+
+def fake_analyze_accounts(contexts, max_parallel, incremental, cancel_event=None):
+    # the real core prints diagnostics like these while it works
+    print("Gender model runtime: eager (loaded in 0.01s)")
+    print("Non-200 while fetching users: 500 - oops")
+    stats = {"total": 2, "male": 1, "female": 1, "unknown": 0, "canceled": False, "fetch_status": "complete", "seconds": 0.1,
+             "details": [("alice", "Alice", "female", 0.9), ("bob", "Bob", "male", 0.8)]}
+    return {ctx.ds_user_id: dict(stats) for ctx in contexts}, {}
+
+def run_cli(monkeypatch, tmp_path, capsys, *args):
+    monkeypatch.chdir(tmp_path)
+    token_file = tmp_path / "instacreds_555.json"
+    token_file.write_text(json.dumps({"csrftoken": "a", "sessionid": "b", "ds_user_id": "555"}))
+    monkeypatch.setattr(core, "analyze_accounts", fake_analyze_accounts)
+    monkeypatch.setattr(sys, "argv", ["insta_cli.py", "--tokens", str(token_file), *args])
+    code = insta_cli.main()
+    return code, capsys.readouterr()
+
+def test_json_stdout_holds_only_the_report(monkeypatch, tmp_path, capsys):
+    code, out = run_cli(monkeypatch, tmp_path, capsys, "--format", "json")
+    assert code == 0
+    report = json.loads(out.out)
+    assert report["555"]["total"] == 2
+    assert "Gender model runtime" in out.err
+
+def test_csv_summary_stdout_holds_only_the_report(monkeypatch, tmp_path, capsys):
+    code, out = run_cli(monkeypatch, tmp_path, capsys, "--format", "csv", "--summary")
+    assert code == 0
+    rows = list(csv.reader(io.StringIO(out.out)))
+    assert rows == [["account", "total", "male", "female", "unknown"], ["555", "2", "1", "1", "0"]]
@@ -0,0 +1,85 @@
+# tests/test_incremental_scan.py
+# Delta scans: early stop on a known page, fallback to a full traversal, failed traversals
+import insta_core as core
+
+PAGE_SIZE = 50
+
+class FakeEdge:
+    """Stands in for iter_user_pages: serves users in pages and records which pages were requested."""
+    def __init__(self, users, fail_at_page=None):
+        self.users = users
+        self.fail_at_page = fail_at_page
+        self.pages = 0
+
+    def __call__(self, query_hash, user_id, edge_type, state=None, ctx=None):
+        state = state if state is not None else {}
+        for start in range(0, len(self.users), PAGE_SIZE):
+            if self.pages == self.fail_at_page:
+                state["status"] = "error"
+                return
+            self.pages += 1
+            state["total"] = len(self.users)
+            state["has_next"] = start + PAGE_SIZE < len(self.users)
+            yield self.users[start:start + PAGE_SIZE]
+        state["status"] = "complete"
+
+def make_users(ids):
+    return [{"id": str(i), "username": f"u{i}", "full_name": f"Name {i}"} for i in ids]
+
+def scan(monkeypatch, edge):
+    monkeypatch.setattr(core, "iter_user_pages", edge)
+    state = {}
+    users = []
+    for chunk in core.iter_users_incremental(core.FOLLOWERS_HASH, "555", "edge_followed_by", True, state):
+        users.extend(chunk)
+    return users, state
+
+def test_unchanged_list_stops_after_one_page(monkeypatch, tmp_path):
+    monkeypatch.setattr(core, "SNAPSHOT_DIR", str(tmp_path))
+    users = make_users(range(300))
+    scan(monkeypatch, FakeEdge(users))
+    edge = FakeEdge(users)
+    result, state = scan(monkeypatch, edge)
+    assert edge.pages == 1
+    assert state["status"] == "stopped"
+    assert result == users
+    assert state["delta"] == {"added": [], "removed": []}
+
+def test_new_users_on_top_are_merged_with_the_snapshot(monkeypatch, tmp_path):
+    monkeypatch.setattr(core, "SNAPSHOT_DIR", str(tmp_path))
+    scan(monkeypatch, FakeEdge(make_users(range(300))))
+    users = make_users(range(1000, 1010)) + make_users(range(300))
+    edge = FakeEdge(users)
+    result, state = scan(monkeypatch, edge)
+    assert edge.pages == 2  # the first page straddles new and known users
+    assert [u["id"] for u in result] == [u["id"] for u in users]
+    assert len(state["delta"]["added"]) == 10 and not state["delta"]["removed"]
+
+def test_deep_removal_forces_a_full_traversal(monkeypatch, tmp_path):
+    monkeypatch.setattr(core, "SNAPSHOT_DIR", str(tmp_path))
+    scan(monkeypatch, FakeEdge(make_users(range(300))))
+    users = make_users(i for i in range(300) if i != 250)
+    edge = FakeEdge(users)
+    result, state = scan(monkeypatch, edge)
+    assert edge.pages == 6
+    assert state["status"] == "complete"
+    assert "250" not in {u["id"] for u in result}
+    assert [u["id"] for u in state["delta"]["removed"]] == ["250"]
+
+def test_failed_traversal_saves_nothing_and_reports_no_delta(monkeypatch, tmp_path):
+    monkeypatch.setattr(core, "SNAPSHOT_DIR", str(tmp_path))
+    users = make_users(range(300))
+    scan(monkeypatch, FakeEdge(users))
+    before = core.load_latest_snapshot("555", "edge_followed_by")
+    # a removal below page 1 rules out the early stop, then page 2 fails
+    result, state = scan(monkeypatch, FakeEdge(users[:-1], fail_at_page=1))
+    assert state["status"] == "error"
+    assert state["delta"] is None
+    assert len(result) == PAGE_SIZE
+    assert core.load_latest_snapshot("555", "edge_followed_by") == before
+
+def test_unfollow_drops_the_user_from_the_following_snapshot(monkeypatch, tmp_path):
+    monkeypatch.setattr(core, "SNAPSHOT_DIR", str(tmp_path))
+    core.save_snapshot("555", "edge_follow", make_users(range(3)))
+    core.remove_from_latest_snapshot("555", "edge_follow", "1")
+    assert [u["id"] for u in core.load_latest_snapshot("555", "edge_follow")["users"]] == ["0", "2"]
@@ -2,118 +2,468 @@
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import TensorDataset, DataLoader, RandomSampler, BatchSampler
+from torch.utils.data.distributed import DistributedSampler
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 import json
 import os
+import random
+import shutil
+import hashlib
+import time
+import argparse
+from name_encoder import MAX_NAME_LEN, CLEAN_PATTERN, clean_name, load_vocab, build_lookup, encode_names, NameLookup
+from gender_model import (GenderCNN, load_eager, export_torchscript, export_onnx, quantize_int8, eager_runtime, torchscript_runtime,
+                          compiled_runtime, compile_model, autocast, bf16_supported, accuracy, benchmark)
 
 # ------------------- CONFIG -------------------
 DATA_PATH = "dataname_clean.csv"  
 MODEL_SAVE = "gender_model.pth"
+SCRIPTED_SAVE = "gender_model.ts"  # frozen TorchScript for fast inference in app.py
+ONNX_SAVE = "gender_model.onnx"    # written with --onnx
+INT8_SAVE = "gender_model_int8.ts" # int8 quantized TorchScript, written with --quantize
+CALIBRATION_SAMPLES = 4096         # training rows used to calibrate int8 activation ranges
 VOCAB_SAVE = "vocab.json"
-MAX_NAME_LEN = 20  
+LOOKUP_SAVE = "name_lookup.npz"    # exact-match table of labelled names, consulted before the model
+CHECKPOINT_SAVE = "gender_model.ckpt"  # model + optimizer + epoch + RNG state, for --resume
+CHECKPOINT_EVERY = 1               # epochs between checkpoints (one is always written when training stops)
 BATCH_SIZE = 64
-EPOCHS = 10
+EPOCHS = 10                        # upper bound, early stopping usually ends the run sooner
+EARLY_STOP_PATIENCE = 3            # stop after this many epochs without a better validation accuracy (0 = never)
+EARLY_STOP_MIN_DELTA = 0.0005      # smaller gains do not count as an improvement
+VAL_SPLIT = 0.2
+SPLIT_SEED = 42
+CORPUS_CACHE_DIR = "corpus_cache"  # encoded corpus, one subfolder per cache key
+CORPUS_FORMAT = 2                  # bump when build_corpus output changes (part of the cache key)
+CORPUS_ARRAYS = ("names", "X", "y", "w", "train_idx", "val_idx")
+FAST_ACC_TOLERANCE = 0.005         # --fast: largest validation accuracy drop accepted from compiled/bf16 inference
+FAST_BASELINE_BATCHES = 50         # --fast: float32 eager batches timed as the per-epoch speedup baseline
+FAST_BENCH_BATCH = 512             # --fast: inference batch size timed for the eager vs compiled speedup
+NUM_THREADS = None  # intra-op threads per process (None = cores / processes)
+NUM_WORKERS = 0     # DataLoader workers (0 = slice batches in-process)
+WORLD_SIZE = 1      # >1 = DistributedDataParallel over gloo, one process per rank
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
 # ------------------- DATASET -------------------
-class NameDataset(Dataset):
-    def __init__(self, names, labels, char_to_idx, max_len):
-        self.names = names
-        self.labels = labels
-        self.char_to_idx = char_to_idx
-        self.max_len = max_len
-
-    def __len__(self):
-        return len(self.names)
-
-    def __getitem__(self, idx):
-        name = self.names[idx].lower()
-        label = 1 if self.labels[idx].lower() == "female" else 0  # 1=female, 0=male
-
-        # One-hot encode chars
-        seq = [self.char_to_idx.get(c, 0) for c in name[:self.max_len]]
-        seq += [0] * (self.max_len - len(seq))  # pad with 0
-        return torch.tensor(seq, dtype=torch.long), torch.tensor(label, dtype=torch.float)
-
-# ------------------- MODEL -------------------
-class GenderCNN(nn.Module):
-    def __init__(self, vocab_size, embed_dim=32, num_filters=64):
-        super().__init__()
-        self.embedding = nn.Embedding(vocab_size, embed_dim, padding_idx=0)
-        self.conv1 = nn.Conv1d(embed_dim, num_filters, kernel_size=3, padding=1)
-        self.conv2 = nn.Conv1d(num_filters, num_filters, kernel_size=3, padding=1)
-        self.pool = nn.AdaptiveMaxPool1d(1)
-        self.fc = nn.Linear(num_filters, 1)
-        self.sigmoid = nn.Sigmoid()
-
-    def forward(self, x):
-        x = self.embedding(x)                # (B, L, E)
-        x = x.transpose(1, 2)                # (B, E, L)
-        x = torch.relu(self.conv1(x))
-        x = torch.relu(self.conv2(x))
-        x = self.pool(x).squeeze(-1)         # (B, F)
-        x = self.fc(x).squeeze(-1)           # (B)
-        return self.sigmoid(x)
+class NameDataset(TensorDataset):
+    """
+    Whole corpus encoded once into contiguous X (N, max_len), y (N,) and w (N,)
+    tensors: one row per unique name, y the fraction of its labelled rows that
+    are female (soft label) and w the number of those rows (sample weight).
+    Indexing works like a TensorDataset; batches() serves minibatches by slicing.
+    """
+    def __init__(self, X, y, w=None):
+        y = torch.as_tensor(y, dtype=torch.float)
+        w = torch.ones_like(y) if w is None else torch.as_tensor(w, dtype=torch.float)
+        super().__init__(torch.as_tensor(X, dtype=torch.long), y, w)
+        self.X, self.y, self.w = self.tensors
 
-# ------------------- TRAIN -------------------
-def train():
-    print("Loading data...")
-    df = pd.read_csv(DATA_PATH)
-    df = df.dropna()
-    df = df[df['name'].str.len() >= 2]
-
-    # Build vocab (all unique chars in names)
-    chars = set(''.join(df['name'].str.lower()))
+    def batches(self, batch_size, shuffle=False):
+        n = len(self.y)
+        order = torch.randperm(n) if shuffle else None
+        for start in range(0, n, batch_size):
+            if order is None:
+                yield self.X[start:start + batch_size], self.y[start:start + batch_size], self.w[start:start + batch_size]
+            else:
+                idx = order[start:start + batch_size]
+                yield self.X[idx], self.y[idx], self.w[idx]
+
+# ------------------- CORPUS -------------------
+def corpus_cache_key(data_path):
+    """Hash of the CSV contents plus every setting that changes the encoded corpus."""
+    h = hashlib.sha256()
+    with open(data_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    h.update(f"{CORPUS_FORMAT}|{MAX_NAME_LEN}|{CLEAN_PATTERN}|{VAL_SPLIT}|{SPLIT_SEED}".encode('utf-8'))
+    return h.hexdigest()[:16]
+
+def aggregate_names(data_path):
+    """
+    Labelled rows of the CSV collapsed by cleaned name (same clean_name as
+    inference). Junk rows are dropped: missing values, labels other than
+    male/female (e.g. repeated "Name,gender" headers) and names shorter than
+    2 characters after cleaning. Returns (names, n_female, n_rows), sorted by name.
+    """
+    df = pd.read_csv(data_path, dtype=str).dropna()
+    label = df['gender'].str.strip().str.lower()
+    rows = pd.DataFrame({"key": [clean_name(n) for n in df['name']], "female": label == "female"})
+    rows = rows[label.isin(["female", "male"]).to_numpy() & (rows["key"].str.len() >= 2).to_numpy()]
+    grouped = rows.groupby("key")["female"].agg(["sum", "count"])
+    print(f"Corpus: {len(df)} rows -> {len(rows)} labelled -> {len(grouped)} unique names "
+          f"({int(((grouped['sum'] > 0) & (grouped['sum'] < grouped['count'])).sum())} with conflicting labels)")
+    return grouped.index.to_numpy(dtype=f'<U{MAX_NAME_LEN}'), grouped["sum"].to_numpy(np.float32), grouped["count"].to_numpy(np.float32)
+
+def build_corpus(data_path):
+    names, n_female, n_rows = aggregate_names(data_path)
+
+    # Build vocab (all unique chars in cleaned names)
+    chars = set(''.join(names))
     char_to_idx = {c: i+1 for i, c in enumerate(sorted(chars))}
     char_to_idx[''] = 0  # padding
-    vocab_size = len(char_to_idx)
-    with open(VOCAB_SAVE, 'w', encoding='utf-8') as f:
+
+    X = encode_names(names, build_lookup(char_to_idx), MAX_NAME_LEN, cleaned=True)
+    y = n_female / n_rows  # soft label: share of this name's rows labelled female
+    w = n_rows             # sample weight: how many rows the name stands for
+    # split unique names, so no name is in both train and validation
+    train_idx, val_idx = train_test_split(np.arange(len(y)), test_size=VAL_SPLIT, random_state=SPLIT_SEED)
+    return {"vocab": char_to_idx, "names": names, "X": X, "y": y, "w": w, "train_idx": train_idx, "val_idx": val_idx}
+
+def save_corpus(corpus, path):
+    # write into a temp folder then rename, so a crash never leaves a half-written cache
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name in CORPUS_ARRAYS:
+        np.save(os.path.join(tmp, f"{name}.npy"), corpus[name])
+    with open(os.path.join(tmp, "vocab.json"), 'w', encoding='utf-8') as f:
+        json.dump(corpus["vocab"], f, ensure_ascii=False)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+def load_corpus(data_path=DATA_PATH, cache_dir=CORPUS_CACHE_DIR):
+    """
+    Return the encoded corpus (vocab, names, X, y, w, train_idx, val_idx). Arrays come
+    from the on-disk cache as copy-on-write memory maps when the cache key
+    matches; otherwise the CSV is parsed, encoded and the cache written.
+    """
+    path = os.path.join(cache_dir, corpus_cache_key(data_path))
+    if os.path.isdir(path):
+        try:
+            corpus = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='c') for name in CORPUS_ARRAYS}
+            corpus["vocab"] = load_vocab(os.path.join(path, "vocab.json"))
+            print(f"Loaded cached corpus: {path}")
+            return corpus
+        except Exception as e:
+            print("Corpus cache unreadable, rebuilding:", e)
+    corpus = build_corpus(data_path)
+    try:
+        save_corpus(corpus, path)
+    except Exception as e:
+        print("Failed to save corpus cache:", e)
+    return corpus
+
+def split_datasets(corpus, char_to_idx=None):
+    """
+    Train/validation NameDatasets for the corpus split. If char_to_idx is given
+    and differs from the corpus vocab (e.g. an older vocab.json), the names are
+    re-encoded with it so the split matches what that model was trained on.
+    """
+    X, y, w = corpus["X"], corpus["y"], corpus["w"]
+    if char_to_idx is not None and char_to_idx != corpus["vocab"]:
+        X = encode_names(corpus["names"], build_lookup(char_to_idx), MAX_NAME_LEN, cleaned=True)
+    train_idx, val_idx = corpus["train_idx"], corpus["val_idx"]
+    return NameDataset(X[train_idx], y[train_idx], w[train_idx]), NameDataset(X[val_idx], y[val_idx], w[val_idx])
+
+def export_name_lookup(corpus):
+    """The aggregated corpus doubles as the exact-match lookup (P(female) + row count per name)."""
+    lookup = NameLookup(corpus["names"], corpus["y"], corpus["w"])
+    lookup.save(LOOKUP_SAVE)
+    print(f"Name lookup saved: {LOOKUP_SAVE} ({len(lookup)} names, {os.path.getsize(LOOKUP_SAVE)/1024:.0f} KB)")
+
+# ------------------- TRAIN -------------------
+def weighted_bce(pred, y, w):
+    # each unique name counts as many times as it appeared in the CSV
+    return (nn.functional.binary_cross_entropy(pred, y, reduction='none') * w).sum() / w.sum()
+
+def evaluate(model, val_ds, device):
+    """Share of labelled validation rows whose label matches the prediction."""
+    model.eval()
+    correct = 0.0
+    with torch.no_grad():
+        for x, y, w in val_ds.batches(BATCH_SIZE):
+            x, y, w = x.to(device), y.to(device), w.to(device)
+            female = model(x) >= 0.5
+            correct += torch.where(female, y * w, (1 - y) * w).sum().item()
+    return correct / max(val_ds.w.sum().item(), 1)
+
+def save_model(state_dict, char_to_idx):
+    """
+    Write MODEL_SAVE and VOCAB_SAVE together (temp files, then renamed one
+    right after the other), so the app never finds weights next to a vocab
+    of another size.
+    """
+    torch.save(state_dict, MODEL_SAVE + ".tmp")
+    with open(VOCAB_SAVE + ".tmp", 'w', encoding='utf-8') as f:
         json.dump(char_to_idx, f, ensure_ascii=False)
+    os.replace(MODEL_SAVE + ".tmp", MODEL_SAVE)
+    os.replace(VOCAB_SAVE + ".tmp", VOCAB_SAVE)
 
-    # Split data
-    train_names, val_names, train_labels, val_labels = train_test_split(
-        df['name'].tolist(), df['gender'].tolist(), test_size=0.2, random_state=42
+def save_checkpoint(path, model, optimizer, epoch, best, char_to_idx):
+    """
+    Everything needed to continue training after epoch: weights, optimizer
+    state, the best epoch so far (accuracy, epoch, weights) and the RNG
+    states, so the resumed run shuffles exactly like an uninterrupted one.
+    Written to a temp file then renamed, so a crash never leaves a torn checkpoint.
+    """
+    state = {
+        "epoch": epoch,
+        "model": model.state_dict(),
+        "optimizer": optimizer.state_dict(),
+        "best": best,
+        "vocab": char_to_idx,
+        "rng": {
+            "torch": torch.get_rng_state(),
+            "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+            "numpy": np.random.get_state(),
+            "python": random.getstate(),
+        },
+    }
+    tmp = path + ".tmp"
+    torch.save(state, tmp)
+    os.replace(tmp, path)
+
+def load_checkpoint(path, model, optimizer, char_to_idx):
+    """
+    Restore a save_checkpoint() file into model and optimizer. Returns
+    (epochs done, best) or None if there is no usable checkpoint.
+    """
+    if not os.path.exists(path):
+        print(f"No checkpoint ({path}), training from scratch")
+        return None
+    try:
+        state = torch.load(path, map_location="cpu", weights_only=False)  # holds numpy / python RNG state
+    except Exception as e:
+        print(f"Checkpoint unreadable ({path}), training from scratch:", e)
+        return None
+    if state["vocab"] != char_to_idx:
+        print(f"Checkpoint {path} was trained with another vocab, training from scratch")
+        return None
+    model.load_state_dict(state["model"])
+    optimizer.load_state_dict(state["optimizer"])
+    rng = state["rng"]
+    torch.set_rng_state(rng["torch"])
+    if rng["cuda"] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(rng["cuda"])
+    np.random.set_state(rng["numpy"])
+    random.setstate(rng["python"])
+    return state["epoch"], state["best"]
+
+def eager_train_throughput(vocab_size, train_ds, device, num_batches=FAST_BASELINE_BATCHES):
+    """Samples/s of plain float32 eager training on a throwaway model: the --fast baseline."""
+    with torch.random.fork_rng():  # leave the real run's RNG stream (and --resume) untouched
+        model = GenderCNN(vocab_size).to(device)
+        optimizer = optim.Adam(model.parameters(), lr=0.001)
+        batches = train_ds.batches(BATCH_SIZE, shuffle=True)
+        next(batches)  # warm-up
+        seen = 0
+        t0 = time.perf_counter()
+        for _, (x, y, w) in zip(range(num_batches), batches):
+            x, y, w = x.to(device), y.to(device), w.to(device)
+            loss = weighted_bce(model(x), y, w)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            seen += len(y)
+    return seen / (time.perf_counter() - t0)
+
+def check_fast_inference(model, val_ds, bf16):
+    """
+    Compare compiled (bf16) inference with float32 eager on the validation set:
+    accuracy delta against FAST_ACC_TOLERANCE, and time per FAST_BENCH_BATCH batch.
+    """
+    model = model.cpu().eval()
+    X, y, w = val_ds.X.numpy(), val_ds.y.numpy(), val_ds.w.numpy()
+    eager, fast = eager_runtime(model), compiled_runtime(model, bf16)
+    label = "compiled+bf16" if bf16 else "compiled"
+    float_acc, fast_acc = accuracy(eager, X, y, weights=w), accuracy(fast, X, y, weights=w)
+    t_eager, t_fast = benchmark(eager, X, FAST_BENCH_BATCH), benchmark(fast, X, FAST_BENCH_BATCH)
+    print(f"Validation Accuracy: float32 {float_acc:.4f} | {label} {fast_acc:.4f} | delta {fast_acc - float_acc:+.4f}")
+    print(f"Inference, batch {FAST_BENCH_BATCH}: eager {t_eager*1000:.2f} ms | {label} {t_fast*1000:.2f} ms | x{t_eager/t_fast:.2f}")
+    if float_acc - fast_acc > FAST_ACC_TOLERANCE:
+        print(f"Warning: {label} loses more than {FAST_ACC_TOLERANCE} accuracy, keep INFERENCE_RUNTIME off \"compiled\"")
+
+def make_train_loader(train_ds, num_workers, rank=0, world_size=1):
+    """
+    DataLoader over whole batches: the sampler yields index lists, so each
+    worker fetches a batch with one tensor slice instead of per-sample collation.
+    """
+    if world_size > 1:
+        base = DistributedSampler(train_ds, num_replicas=world_size, rank=rank, shuffle=True, seed=SPLIT_SEED)
+    else:
+        base = RandomSampler(train_ds)
+    return DataLoader(
+        train_ds,
+        sampler=BatchSampler(base, BATCH_SIZE, drop_last=False),
+        batch_size=None,
+        num_workers=num_workers,
+        pin_memory=(DEVICE == "cuda"),
+        persistent_workers=num_workers > 0,
     )
 
-    train_ds = NameDataset(train_names, train_labels, char_to_idx, MAX_NAME_LEN)
-    val_ds = NameDataset(val_names, val_labels, char_to_idx, MAX_NAME_LEN)
-    train_dl = DataLoader(train_ds, batch_size=BATCH_SIZE, shuffle=True)
-    val_dl = DataLoader(val_ds, batch_size=BATCH_SIZE)
+def train(num_threads=NUM_THREADS, num_workers=NUM_WORKERS, world_size=WORLD_SIZE, onnx=False, quantize=False,
+          epochs=EPOCHS, patience=EARLY_STOP_PATIENCE, resume=False, fast=False):
+    options = (onnx, quantize, epochs, patience, resume, fast)
+    if world_size > 1:
+        load_corpus()  # build the corpus cache once, before the ranks start
+        mp.spawn(train_worker, args=(world_size, num_threads, num_workers, *options), nprocs=world_size, join=True)
+    else:
+        train_worker(0, 1, num_threads, num_workers, *options)
+
+def export_model(model, onnx=False, quantize=False, train_ds=None, val_ds=None):
+    export_torchscript(model, SCRIPTED_SAVE)
+    print(f"TorchScript saved: {SCRIPTED_SAVE}")
+    if onnx:
+        try:
+            export_onnx(model, ONNX_SAVE)
+            print(f"ONNX saved: {ONNX_SAVE}")
+        except Exception as e:
+            print("ONNX export failed:", e)
+    if quantize:
+        try:
+            export_int8(model, train_ds, val_ds)
+        except Exception as e:
+            print("int8 quantization failed:", e)
 
-    model = GenderCNN(vocab_size).to(DEVICE)
-    criterion = nn.BCELoss()
+def export_int8(model, train_ds, val_ds):
+    """Quantize to int8, save it as TorchScript and compare validation accuracy with float32."""
+    calib = train_ds.X[:CALIBRATION_SAMPLES]
+    model = model.cpu().eval()
+    qmodel = quantize_int8(model, (calib[i:i + 512] for i in range(0, len(calib), 512)))
+    export_torchscript(qmodel, INT8_SAVE)
+    # evaluate the saved artifact, i.e. exactly what app.py will load
+    float_acc = accuracy(eager_runtime(model), val_ds.X.numpy(), val_ds.y.numpy(), weights=val_ds.w.numpy())
+    int8_acc = accuracy(torchscript_runtime(INT8_SAVE), val_ds.X.numpy(), val_ds.y.numpy(), weights=val_ds.w.numpy())
+    print(f"int8 saved: {INT8_SAVE} ({os.path.getsize(INT8_SAVE)/1024:.0f} KB, float32 weights {os.path.getsize(MODEL_SAVE)/1024:.0f} KB)")
+    print(f"Validation Accuracy: float32 {float_acc:.4f} | int8 {int8_acc:.4f} | delta {int8_acc - float_acc:+.4f}")
+
+def train_worker(rank, world_size, num_threads, num_workers, onnx=False, quantize=False,
+                 epochs=EPOCHS, patience=EARLY_STOP_PATIENCE, resume=False, fast=False):
+    distributed = world_size > 1
+    device = "cpu" if distributed else DEVICE
+    torch.set_num_threads(num_threads or max(1, (os.cpu_count() or 1) // world_size))
+    if distributed:
+        os.environ.setdefault("MASTER_ADDR", "127.0.0.1")
+        os.environ.setdefault("MASTER_PORT", "29500")
+        dist.init_process_group("gloo", rank=rank, world_size=world_size)
+        torch.manual_seed(SPLIT_SEED)
+    is_main = rank == 0
+
+    if is_main:
+        print("Loading data...")
+    t0 = time.perf_counter()
+    corpus = load_corpus()
+    char_to_idx = corpus["vocab"]
+    vocab_size = len(char_to_idx)
+
+    # Split data
+    train_ds, val_ds = split_datasets(corpus)
+    train_dl = make_train_loader(train_ds, num_workers, rank, world_size) if (num_workers or distributed) else None
+    if is_main:
+        print(f"Data ready in {time.perf_counter() - t0:.2f}s")
+
+    model = GenderCNN(vocab_size).to(device)
     optimizer = optim.Adam(model.parameters(), lr=0.001)
+    start_epoch = 0
+    best = {"accuracy": -1.0, "epoch": 0, "model": None}
+    restored = load_checkpoint(CHECKPOINT_SAVE, model, optimizer, char_to_idx) if resume else None
+    if restored is not None:
+        start_epoch, best = restored
+        if is_main:
+            print(f"Resumed from {CHECKPOINT_SAVE} after epoch {start_epoch} (best validation accuracy {best['accuracy']:.4f} at epoch {best['epoch']})")
+        if patience and start_epoch - best["epoch"] >= patience:
+            start_epoch = epochs  # that run had already stopped early
+    net = DistributedDataParallel(model) if distributed else model
+    # --fast: compiled graph, bf16 autocast where the CPU has native bf16; weights stay float32
+    bf16 = fast and device == "cpu" and bf16_supported()
+    baseline = eager_train_throughput(vocab_size, train_ds, device) if fast and is_main else None
+    if fast:
+        net = compile_model(net)
 
-    print(f"Training on {DEVICE} | {len(train_ds)} samples")
-    for epoch in range(EPOCHS):
-        model.train()
+    if is_main:
+        print(f"Training on {device} | {len(train_ds)} unique names ({train_ds.w.sum().item():.0f} rows) | {world_size} process(es) x {torch.get_num_threads()} threads | {num_workers} loader workers")
+        if fast:
+            print(f"Fast mode: torch.compile{' + bf16 autocast' if bf16 else ' (no native bf16 on this CPU)'} | float32 eager baseline {baseline:.0f} samples/s")
+    for epoch in range(start_epoch, epochs):
+        net.train()
+        if distributed:
+            train_dl.sampler.sampler.set_epoch(epoch)
+        batches = train_dl if train_dl is not None else train_ds.batches(BATCH_SIZE, shuffle=True)
         total_loss = 0
-        for x, y in train_dl:
-            x, y = x.to(DEVICE), y.to(DEVICE)
-            pred = model(x)
-            loss = criterion(pred, y)
+        num_batches = 0
+        seen = 0
+        t_epoch = time.perf_counter()
+        for x, y, w in batches:
+            x, y, w = x.to(device, non_blocking=True), y.to(device, non_blocking=True), w.to(device, non_blocking=True)
+            with autocast(bf16):
+                pred = net(x)
+            loss = weighted_bce(pred.float(), y, w)
             optimizer.zero_grad()
             loss.backward()
             optimizer.step()
             total_loss += loss.item()
-        print(f"Epoch {epoch+1}/{EPOCHS} | Loss: {total_loss/len(train_dl):.4f}")
-
-        # Validation (optional)
-        model.eval()
-        correct = 0
-        with torch.no_grad():
-            for x, y in val_dl:
-                x, y = x.to(DEVICE), y.to(DEVICE)
-                pred = model(x).round()
-                correct += (pred == y).sum().item()
-        print(f"Validation Accuracy: {correct / len(val_ds):.2f}")
-
-    # Save model
-    torch.save(model.state_dict(), MODEL_SAVE)
-    print(f"Model saved: {MODEL_SAVE}, {VOCAB_SAVE}")
+            num_batches += 1
+            seen += len(y)
+        elapsed = time.perf_counter() - t_epoch
+        if distributed:
+            totals = torch.tensor([total_loss, num_batches, seen], dtype=torch.float64)
+            dist.all_reduce(totals)
+            total_loss, num_batches, seen = totals.tolist()
+        stop = False
+        if is_main:
+            speedup = f" (x{seen/elapsed/baseline:.2f} vs eager float32)" if baseline else ""
+            print(f"Epoch {epoch+1}/{epochs} | Loss: {total_loss/max(num_batches, 1):.4f} | {seen/elapsed:.0f} samples/s{speedup}")
+
+            # Validation: keep the best weights, stop once they stop improving
+            acc = evaluate(model, val_ds, device)
+            if acc > best["accuracy"] + EARLY_STOP_MIN_DELTA:
+                best = {"accuracy": acc, "epoch": epoch + 1, "model": {k: v.detach().cpu().clone() for k, v in model.state_dict().items()}}
+                save_model(best["model"], char_to_idx)
+                print(f"Validation Accuracy: {acc:.4f} (best, saved {MODEL_SAVE}, {VOCAB_SAVE})")
+            else:
+                print(f"Validation Accuracy: {acc:.4f} (best {best['accuracy']:.4f} at epoch {best['epoch']})")
+            stop = bool(patience) and epoch + 1 - best["epoch"] >= patience
+            if stop or epoch + 1 == epochs or (epoch + 1) % CHECKPOINT_EVERY == 0:
+                save_checkpoint(CHECKPOINT_SAVE, model, optimizer, epoch + 1, best, char_to_idx)
+            if stop:
+                print(f"Early stopping: no improvement for {patience} epochs")
+        if distributed:
+            flag = torch.tensor([int(stop)])
+            dist.broadcast(flag, 0)
+            stop = bool(flag.item())
+        if stop:
+            break
+
+    # Save model (the best epoch, not the last one)
+    if is_main:
+        if best["model"] is not None:
+            model.load_state_dict(best["model"])
+        save_model(model.state_dict(), char_to_idx)
+        print(f"Model saved: {MODEL_SAVE} (epoch {best['epoch']}, validation accuracy {best['accuracy']:.4f}), {VOCAB_SAVE}")
+        export_model(model, onnx, quantize, train_ds, val_ds)
+        export_name_lookup(corpus)
+        if fast:
+            check_fast_inference(model, val_ds, bf16_supported())
+    if distributed:
+        dist.destroy_process_group()
 
 if __name__ == "__main__":
-    train()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the GenderCNN name model")
+    parser.add_argument("--threads", type=int, default=NUM_THREADS, help="intra-op threads per process")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS, help="DataLoader worker processes (0 = in-process slicing)")
+    parser.add_argument("--ddp", type=int, default=WORLD_SIZE, metavar="N", help="train with N DistributedDataParallel processes (gloo)")
+    parser.add_argument("--onnx", action="store_true", help="also export the model to ONNX")
+    parser.add_argument("--quantize", action="store_true", help=f"also write an int8 model ({INT8_SAVE}) and report its accuracy")
+    parser.add_argument("--epochs", type=int, default=EPOCHS, help="maximum number of epochs")
+    parser.add_argument("--patience", type=int, default=EARLY_STOP_PATIENCE, help="early stopping patience in epochs (0 = train all epochs)")
+    parser.add_argument("--resume", action="store_true", help=f"continue from {CHECKPOINT_SAVE}")
+    parser.add_argument("--fast", action="store_true", help="torch.compile + bfloat16 autocast (CPUs with AVX-512 BF16/AMX), reports speedup and accuracy delta")
+    parser.add_argument("--export-only", action="store_true", help=f"re-export {MODEL_SAVE} without training")
+    args = parser.parse_args()
+    if args.export_only:
+        char_to_idx = load_vocab(VOCAB_SAVE)
+        corpus = load_corpus()
+        train_ds, val_ds = split_datasets(corpus, char_to_idx) if args.quantize or args.fast else (None, None)
+        model = load_eager(MODEL_SAVE, len(char_to_idx))
+        export_model(model, args.onnx, args.quantize, train_ds, val_ds)
+        export_name_lookup(corpus)
+        if args.fast:
+            check_fast_inference(model, val_ds, bf16_supported())
+    else:
+        train(num_threads=args.threads, num_workers=args.workers, world_size=args.ddp, onnx=args.onnx, quantize=args.quantize,
+              epochs=args.epochs, patience=args.patience, resume=args.resume, fast=args.fast)